@@ -3,10 +3,11 @@ from typing import Optional
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import os
+import secrets
 from dotenv import load_dotenv
 
 import models
@@ -17,6 +18,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "ton_secret_key_super_securise")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Endpoints d'administration désactivés tant qu'aucun token n'est configuré
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -57,3 +60,10 @@ def get_current_user(
     if user is None:
         raise credentials_exception
     return user
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès administrateur requis",
+        )
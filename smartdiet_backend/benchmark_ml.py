@@ -0,0 +1,237 @@
+"""
+Benchmark for the food recognition pipeline.
+
+Measures decode, preprocessing and forward-pass time, end-to-end latency
+percentiles and throughput for several batch sizes and torch thread counts,
+then writes the results as JSON:
+
+    python benchmark_ml.py --backend onnx --batch-sizes 1,8,16 --threads 1,4
+    python benchmark_ml.py --baseline benchmark_results.json   # regression check
+
+Without --images, synthetic phone-sized JPEGs are generated. Without a trained
+model, a randomly initialized MobileNetV2 is timed instead.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ml_backends import (
+    INFERENCE_BACKEND,
+    EagerBackend,
+    build_model,
+    list_images,
+    load_backend,
+    load_class_mapping,
+)
+from ml_preprocess import decode_image, preprocess_batch, to_array
+
+MODEL_PATH = "banana_model_v1.pth"
+CLASS_MAPPING_PATH = "class_mapping.txt"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(values_ms):
+    if not values_ms:
+        return {}
+    return {
+        "mean": round(sum(values_ms) / len(values_ms), 3),
+        "p50": round(percentile(values_ms, 50), 3),
+        "p95": round(percentile(values_ms, 95), 3),
+        "p99": round(percentile(values_ms, 99), 3),
+        "max": round(max(values_ms), 3),
+    }
+
+
+def synthetic_images(count, width, height, seed=0):
+    """Smooth gradients plus noise, encoded as JPEG like a phone photo."""
+    rng = np.random.default_rng(seed)
+    images = []
+    y, x = np.mgrid[0:height, 0:width]
+    for _ in range(count):
+        base = rng.integers(0, 255, size=3)
+        pixels = np.stack([
+            (base[c] + x * rng.uniform(0, 0.2) + y * rng.uniform(0, 0.2)) % 255 for c in range(3)
+        ], axis=-1)
+        pixels += rng.normal(0, 12, size=pixels.shape)
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(images_dir, count):
+    images = []
+    for path in list_images(images_dir, count):
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def make_backend(name):
+    mapping = load_class_mapping(CLASS_MAPPING_PATH) or {"banana": 0, "other": 1}
+    cpu = torch.device("cpu")
+    if os.path.exists(MODEL_PATH):
+        return load_backend(name, MODEL_PATH, len(mapping), cpu), mapping
+    print(f"{MODEL_PATH} not found, timing a randomly initialized model (eager)")
+    return EagerBackend(build_model(len(mapping)).eval(), cpu), mapping
+
+
+def bench_stages(images):
+    """Per-image decode and resize time, independent of batch size."""
+    decode_ms, resize_ms, arrays = [], [], []
+    for data in images:
+        start = time.perf_counter()
+        image = decode_image(data)
+        decode_ms.append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        arrays.append(to_array(image))
+        resize_ms.append(1000 * (time.perf_counter() - start))
+    return arrays, {"decode_ms": summarize(decode_ms), "resize_ms": summarize(resize_ms)}
+
+
+def bench_batches(backend, images, arrays, batch_size, warmup):
+    """
+    Runs the images through decode -> preprocess -> forward in batches. Every
+    image of a batch is assigned the batch's end-to-end time as its latency.
+    """
+    for start in range(0, min(warmup, len(arrays)), batch_size):
+        backend(preprocess_batch(arrays[start:start + batch_size]))
+
+    normalize_ms, forward_ms, latencies = [], [], []
+    total_start = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        batch_start = time.perf_counter()
+        batch_arrays = [to_array(decode_image(data)) for data in chunk]
+
+        t0 = time.perf_counter()
+        batch = preprocess_batch(batch_arrays)
+        t1 = time.perf_counter()
+        with torch.no_grad():
+            torch.softmax(backend(batch).float(), dim=1)
+        t2 = time.perf_counter()
+
+        normalize_ms.append(1000 * (t1 - t0))
+        forward_ms.append(1000 * (t2 - t1))
+        latencies.extend([1000 * (t2 - batch_start)] * len(chunk))
+    elapsed = time.perf_counter() - total_start
+
+    return {
+        "batch_size": batch_size,
+        "normalize_ms_per_batch": summarize(normalize_ms),
+        "forward_ms_per_batch": summarize(forward_ms),
+        "forward_ms_per_image": round(sum(forward_ms) / len(images), 3),
+        "latency_ms": summarize(latencies),
+        "throughput_ips": round(len(images) / elapsed, 2),
+    }
+
+
+def compare(results, baseline_path, max_regression):
+    """Returns the runs whose p95 latency regressed by more than `max_regression`."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(run["threads"], run["batch_size"]): run for run in baseline.get("runs", [])}
+
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get((run["threads"], run["batch_size"]))
+        if not before:
+            continue
+        old, new = before["latency_ms"]["p95"], run["latency_ms"]["p95"]
+        if old and (new - old) / old > max_regression:
+            regressions.append({
+                "threads": run["threads"],
+                "batch_size": run["batch_size"],
+                "baseline_p95_ms": old,
+                "p95_ms": new,
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the food recognition pipeline")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND)
+    parser.add_argument("--images", help="folder of images (default: synthetic JPEGs)")
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--synthetic-size", default="1600x1200", help="WIDTHxHEIGHT")
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--threads", default=str(torch.get_num_threads()))
+    parser.add_argument("--warmup", type=int, default=8)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.images:
+        images = load_images(args.images, args.num_images)
+    else:
+        width, height = (int(v) for v in args.synthetic_size.lower().split("x"))
+        images = synthetic_images(args.num_images, width, height)
+    if not images:
+        print("ERROR: no images to benchmark")
+        return 1
+
+    backend, mapping = make_backend(args.backend)
+    arrays, stages = bench_stages(images)
+    print(f"Decode: {stages['decode_ms']}  Resize: {stages['resize_ms']}")
+
+    runs = []
+    for threads in (int(t) for t in args.threads.split(",")):
+        torch.set_num_threads(threads)
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            run = {"threads": threads, **bench_batches(backend, images, arrays, batch_size, args.warmup)}
+            runs.append(run)
+            print(
+                f"threads={threads:<3} batch={batch_size:<3} "
+                f"p50={run['latency_ms']['p50']:.1f}ms p95={run['latency_ms']['p95']:.1f}ms "
+                f"p99={run['latency_ms']['p99']:.1f}ms throughput={run['throughput_ips']:.1f} img/s"
+            )
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "backend": backend.name,
+            "model_path": MODEL_PATH if os.path.exists(MODEL_PATH) else None,
+            "num_classes": len(mapping),
+            "num_images": len(images),
+            "image_source": args.images or f"synthetic {args.synthetic_size}",
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "stages": stages,
+        "runs": runs,
+    }
+
+    status = 0
+    if args.baseline:
+        results["regressions"] = compare(results, args.baseline, args.max_regression)
+        for regression in results["regressions"]:
+            print(f"REGRESSION: {regression}")
+        status = 1 if results["regressions"] else 0
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
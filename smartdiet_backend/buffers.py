@@ -0,0 +1,43 @@
+"""File objects over in-memory buffers, without copying them."""
+import io
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file over any bytes-like object. io.BytesIO copies
+    everything but `bytes`; this reads straight from the caller's buffer,
+    e.g. the memoryview returned by uploads.read_upload.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        memoryview(buffer).cast("B")[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
@@ -0,0 +1,180 @@
+"""
+Change tracking for the foods catalogue.
+
+The in-memory copies of the foods table (the food search snapshot and the
+nutrition index) poll catalogue_signature() and rebuild when it changes.
+Besides (count, max id), the signature carries a version counter stored in
+catalogue_versions and bumped by triggers on every INSERT, UPDATE or DELETE
+of foods, so edits that keep the row count and max id (renamed foods, new
+macros, import upserts) are picked up as well. The triggers are installed
+by `python database.py`; bulk writers also call bump_version() in their own
+transaction.
+
+A single CataloguePoller per process runs that query for all of them.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+
+import models
+from database import SessionLocal
+
+CATALOGUE_NAME = "foods"
+# How often the foods table is checked for changes (seconds), 0 disables background checks
+CATALOGUE_REFRESH_SECONDS = float(os.getenv("FOOD_CATALOGUE_REFRESH_SECONDS", "60"))
+
+BUMP_VERSION = text("UPDATE catalogue_versions SET version = version + 1 WHERE name = :name")
+
+# One bump per statement, so bulk upserts cost a single row update
+POSTGRES_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION bump_foods_version() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE catalogue_versions SET version = version + 1 WHERE name = 'foods';
+        RETURN NULL;
+    END $$
+    """,
+    "DROP TRIGGER IF EXISTS foods_version ON foods",
+    """
+    CREATE TRIGGER foods_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON foods
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_foods_version()
+    """,
+]
+
+# SQLite only has row-level triggers
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS foods_version_{event.lower()} AFTER {event} ON foods
+    BEGIN
+        UPDATE catalogue_versions SET version = version + 1 WHERE name = 'foods';
+    END
+    """
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+
+def install(engine):
+    """Creates the version row and the triggers on foods. Returns False on unsupported databases."""
+    triggers = {"postgresql": POSTGRES_TRIGGERS, "sqlite": SQLITE_TRIGGERS}.get(engine.dialect.name)
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM catalogue_versions WHERE name = :name"), {"name": CATALOGUE_NAME}
+        ).first()
+        if exists is None:
+            connection.execute(
+                models.CatalogueVersion.__table__.insert().values(name=CATALOGUE_NAME, version=0)
+            )
+        for statement in triggers or ():
+            connection.execute(text(statement))
+    return triggers is not None
+
+
+def bump_version(connection):
+    """Marks the catalogue as changed, within the caller's transaction."""
+    connection.execute(BUMP_VERSION, {"name": CATALOGUE_NAME})
+
+
+def catalogue_signature(db):
+    """
+    (count, max id, version) of the foods table; version is None when the
+    tracking table is missing (`python database.py` not run since it was
+    added), in which case only inserts and deletes are noticed.
+    """
+    count, max_id = db.query(func.count(models.Food.id), func.max(models.Food.id)).one()
+    try:
+        version = db.query(models.CatalogueVersion.version).filter(
+            models.CatalogueVersion.name == CATALOGUE_NAME
+        ).scalar()
+    except SQLAlchemyError:
+        db.rollback()
+        version = None
+    return count, max_id, version
+
+
+class CataloguePoller:
+    """
+    Polls catalogue_signature() for the in-memory copies of the foods table.
+    Subscribers are `rebuild(db, signature)` callbacks; each is called with an
+    open session when the catalogue changed since its last successful
+    rebuild, so one that raised is retried on the next check. Checks are
+    serialized, and at most one every `refresh_seconds` runs in the
+    background.
+    """
+
+    def __init__(self, session_factory=SessionLocal, refresh_seconds=CATALOGUE_REFRESH_SECONDS,
+                 on_change=None):
+        self.session_factory = session_factory
+        self.refresh_seconds = refresh_seconds
+        self._signatures = {}  # rebuild callback -> signature of its last successful rebuild
+        self.errors = {}  # rebuild callback -> error of its last failed rebuild
+        self._checked_at = 0.0
+        self._checking = threading.Lock()
+        if on_change is not None:
+            self.subscribe(on_change)
+
+    def subscribe(self, rebuild):
+        self._signatures.setdefault(rebuild, None)
+        return rebuild
+
+    def signature(self, rebuild):
+        """Signature `rebuild` last succeeded on, None if it never did."""
+        return self._signatures.get(rebuild)
+
+    def check(self, force=False, only=None):
+        """
+        Calls the subscribers (or just `only`) whose copy is outdated, every
+        one of them with `force`. Returns True if any was rebuilt.
+        """
+        with self._checking:
+            return self._check(force, only)
+
+    def _check(self, force, only):
+        self._checked_at = time.monotonic()
+        db = self.session_factory()
+        try:
+            try:
+                signature = catalogue_signature(db)
+            except Exception as e:
+                # Readers keep using the copies they have
+                print(f"Food catalogue check failed: {e}")
+                return False
+            rebuilt = False
+            for rebuild in [only] if only is not None else list(self._signatures):
+                if not force and self._signatures.get(rebuild) == signature:
+                    continue
+                try:
+                    rebuild(db, signature)
+                except Exception as e:
+                    db.rollback()
+                    self.errors[rebuild] = str(e)
+                    print(f"Food catalogue refresh failed ({getattr(rebuild, '__qualname__', rebuild)}): {e}")
+                    continue
+                self._signatures[rebuild] = signature
+                self.errors.pop(rebuild, None)
+                rebuilt = True
+            return rebuilt
+        finally:
+            db.close()
+
+    def maybe_check_async(self):
+        """Starts a background check if the last one is older than refresh_seconds."""
+        if self.refresh_seconds <= 0 or time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        if not self._checking.acquire(blocking=False):
+            return
+        self._checked_at = time.monotonic()
+
+        def run():
+            try:
+                self._check(False, None)
+            finally:
+                self._checking.release()
+
+        threading.Thread(target=run, name="food-catalogue-refresh", daemon=True).start()
+
+
+poller = CataloguePoller()
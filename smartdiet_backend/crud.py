@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
 import models
 import schemas
 from auth import get_password_hash, verify_password
@@ -57,6 +58,9 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
 def create_meal(db: Session, meal: schemas.MealCreate):
     db_meal = models.Meal(**meal.dict())
     db.add(db_meal)
+    # Le repas et le total du jour sont validés dans la même transaction
+    db.flush()
+    add_to_daily_total(db, db_meal)
     db.commit()
     db.refresh(db_meal)
     return db_meal
@@ -64,28 +68,130 @@ def create_meal(db: Session, meal: schemas.MealCreate):
 def get_meals_by_user(db: Session, user_id: int, limit: int = 100):
     return db.query(models.Meal).filter(models.Meal.user_id == user_id).order_by(models.Meal.created_at.desc()).limit(limit).all()
 
-def get_meals_by_date(db: Session, user_id: int, date: str):
-    return db.query(models.Meal).filter(
+# Colonnes renvoyées par les listes paginées (requête sans hydratation ORM)
+MEAL_COLUMNS = (
+    models.Meal.id, models.Meal.user_id, models.Meal.name, models.Meal.meal_type,
+    models.Meal.calories, models.Meal.protein, models.Meal.carbs, models.Meal.fat,
+    models.Meal.fiber, models.Meal.quantity, models.Meal.unit, models.Meal.date,
+    models.Meal.time, models.Meal.notes, models.Meal.created_at,
+)
+WEIGHT_LOG_COLUMNS = (
+    models.WeightLog.id, models.WeightLog.user_id, models.WeightLog.weight,
+    models.WeightLog.date, models.WeightLog.created_at,
+)
+
+def get_meals_page(db: Session, user_id: int, limit: int = 100, after: Optional[tuple] = None):
+    """
+    Repas du plus récent au plus ancien, en dicts. `after` = (created_at, id)
+    du dernier repas de la page précédente : pagination par clé, servie par
+    l'index (user_id, created_at, id) quelle que soit la profondeur.
+    """
+    query = db.query(*MEAL_COLUMNS).filter(models.Meal.user_id == user_id)
+    if after is not None:
+        created_at, meal_id = after
+        query = query.filter(or_(
+            models.Meal.created_at < created_at,
+            and_(models.Meal.created_at == created_at, models.Meal.id < meal_id),
+        ))
+    rows = query.order_by(models.Meal.created_at.desc(), models.Meal.id.desc()).limit(limit)
+    return [row._asdict() for row in rows]
+
+# Colonnes de daily_totals -> valeur ajoutée par un repas
+DAILY_TOTAL_COLUMNS = {
+    "total_calories": models.Meal.calories,
+    "total_protein": models.Meal.protein,
+    "total_carbs": models.Meal.carbs,
+    "total_fat": models.Meal.fat,
+}
+
+def _day_aggregate(user_id: int, date: str):
+    """SELECT user_id, date, sommes... FROM meals d'un jour, en un seul GROUP BY"""
+    return select(
+        models.Meal.user_id,
+        models.Meal.date,
+        *[func.coalesce(func.sum(column), 0).label(name) for name, column in DAILY_TOTAL_COLUMNS.items()],
+        func.count(models.Meal.id).label("meal_count"),
+        literal(datetime.utcnow()).label("updated_at"),
+    ).where(
         models.Meal.user_id == user_id,
         models.Meal.date == date
-    ).all()
-
-def get_daily_stats(db: Session, user_id: int, date: str):
-    meals = get_meals_by_date(db, user_id, date)
-    total_calories = sum(meal.calories for meal in meals)
-    total_protein = sum(meal.protein for meal in meals)
-    total_carbs = sum(meal.carbs for meal in meals)
-    total_fat = sum(meal.fat for meal in meals)
-    
+    ).group_by(models.Meal.user_id, models.Meal.date)
+
+def add_to_daily_total(db: Session, meal: models.Meal):
+    """
+    Ajoute un repas (déjà flushé) au total de son jour, sans commit.
+
+    La première fois qu'un jour est touché, la ligne est calculée depuis les
+    repas du jour, ce qui couvre les jours antérieurs à daily_totals ; ensuite
+    chaque repas ne fait qu'incrémenter la ligne, verrouillée par l'upsert.
+    """
+    increments = {name: getattr(meal, column.key) or 0 for name, column in DAILY_TOTAL_COLUMNS.items()}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        table = models.DailyTotal.__table__
+        statement = insert(table).from_select(
+            ["user_id", "date", *DAILY_TOTAL_COLUMNS, "meal_count", "updated_at"],
+            _day_aggregate(meal.user_id, meal.date),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={
+                **{name: table.c[name] + value for name, value in increments.items()},
+                "meal_count": table.c.meal_count + 1,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(statement)
+        return
+
+    total = db.query(models.DailyTotal).filter(
+        models.DailyTotal.user_id == meal.user_id,
+        models.DailyTotal.date == meal.date
+    ).with_for_update().first()
+    if total is None:
+        row = db.execute(_day_aggregate(meal.user_id, meal.date)).one()
+        db.add(models.DailyTotal(**row._asdict()))
+    else:
+        for name, value in increments.items():
+            setattr(total, name, getattr(total, name) + value)
+        total.meal_count += 1
+
+def _stats(db: Session, user_id: int, date: str, total: Optional[models.DailyTotal]):
+    if total is not None:
+        values = {name: getattr(total, name) for name in DAILY_TOTAL_COLUMNS}
+        meal_count = total.meal_count
+    else:
+        # Jour sans ligne daily_totals (aucun repas créé depuis) : agrégat SQL
+        row = db.execute(_day_aggregate(user_id, date)).first()
+        values = {name: getattr(row, name) if row else 0 for name in DAILY_TOTAL_COLUMNS}
+        meal_count = row.meal_count if row else 0
+
     return {
         "date": date,
-        "total_calories": total_calories,
-        "total_protein": total_protein,
-        "total_carbs": total_carbs,
-        "total_fat": total_fat,
-        "meal_count": len(meals)
+        **values,
+        "meal_count": meal_count
     }
 
+def get_day(db: Session, user_id: int, date: str):
+    """
+    Repas d'un jour et leurs totaux en une seule requête : chaque repas est
+    joint à la ligne daily_totals de son jour. Un jour sans repas n'a pas de
+    totaux ; seul un jour antérieur à daily_totals repasse par l'agrégat.
+    """
+    rows = db.query(models.Meal, models.DailyTotal).outerjoin(
+        models.DailyTotal,
+        and_(models.DailyTotal.user_id == models.Meal.user_id, models.DailyTotal.date == models.Meal.date)
+    ).filter(
+        models.Meal.user_id == user_id,
+        models.Meal.date == date
+    ).order_by(models.Meal.id).all()
+
+    meals = [meal for meal, _ in rows]
+    if not rows:
+        return meals, {"date": date, **{name: 0 for name in DAILY_TOTAL_COLUMNS}, "meal_count": 0}
+    return meals, _stats(db, user_id, date, rows[0][1])
+
 # WEIGHT LOG CRUD
 def create_weight_log(db: Session, weight_log: schemas.WeightLogCreate):
     db_log = models.WeightLog(**weight_log.dict())
@@ -99,11 +205,14 @@ def get_weight_logs(db: Session, user_id: int, limit: int = 30):
         models.WeightLog.user_id == user_id
     ).order_by(models.WeightLog.date.desc()).limit(limit).all()
 
-def get_foods(db: Session, query: str = None, limit: int = 20):
-    """Rechercher des aliments"""
-    sql_query = db.query(models.Food)
-    if query:
-        # Recherche insensible à la casse
-        sql_query = sql_query.filter(models.Food.name.ilike(f"%{query}%"))
-    
-    return sql_query.limit(limit).all()
\ No newline at end of file
+def get_weight_logs_page(db: Session, user_id: int, limit: int = 30, after: Optional[tuple] = None):
+    """Pesées de la plus récente à la plus ancienne, en dicts. `after` = (date, id)"""
+    query = db.query(*WEIGHT_LOG_COLUMNS).filter(models.WeightLog.user_id == user_id)
+    if after is not None:
+        date, log_id = after
+        query = query.filter(or_(
+            models.WeightLog.date < date,
+            and_(models.WeightLog.date == date, models.WeightLog.id < log_id),
+        ))
+    rows = query.order_by(models.WeightLog.date.desc(), models.WeightLog.id.desc()).limit(limit)
+    return [row._asdict() for row in rows]
@@ -21,4 +21,25 @@ def get_db():
         db.close()
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # The tables are only registered on Base.metadata once models is imported
+    import models  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+    # create_all skips indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # Trigram search index on foods (Postgres only) and catalogue change tracking;
+    # imported here, they need the models
+    import catalogue
+    import food_search
+    food_search.install(engine)
+    catalogue.install(engine)
+
+
+if __name__ == "__main__":
+    # Explicit schema creation step, run before starting the API. Goes through
+    # the importable module: models registers its tables on database.Base,
+    # not on this script's own copy
+    import database
+    database.init_db()
+    print("Database schema created")
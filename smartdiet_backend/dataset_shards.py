@@ -0,0 +1,178 @@
+"""
+Packed training data: dataset/<class>/*.jpg converted once into shards of
+pre-resized uint8 images that are read through np.memmap, instead of
+reopening and decoding thousands of JPEGs every epoch.
+
+    dataset_shards/
+        index.json           classes, image size, shard sizes, source fingerprint
+        labels.npy           int64 label of every image, in shard order
+        shard_00000.npy      uint8 [count, size, size, 3]
+        ...
+
+    python dataset_shards.py --data dataset --out dataset_shards
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+from ml_preprocess import INPUT_SIZE, MEAN, STD, decode_image, to_array
+
+SHARDS_DIR = "dataset_shards"
+SHARD_SIZE = 1024
+INDEX_FILENAME = "index.json"
+LABELS_FILENAME = "labels.npy"
+
+
+def list_samples(data_dir):
+    """(path, label) pairs and class_to_idx, ordered exactly like ImageFolder."""
+    classes = sorted(entry.name for entry in os.scandir(data_dir) if entry.is_dir())
+    class_to_idx = {name: i for i, name in enumerate(classes)}
+    samples = []
+    for name in classes:
+        for root, _, filenames in sorted(os.walk(os.path.join(data_dir, name), followlinks=True)):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMG_EXTENSIONS):
+                    samples.append((os.path.join(root, filename), class_to_idx[name]))
+    return samples, class_to_idx
+
+
+def fingerprint(samples, salt=""):
+    """Hash of every (path, size, mtime, label); changes when any image does."""
+    digest = hashlib.sha256(salt.encode())
+    for path, label in samples:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{label}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def build_shards(data_dir, out_dir=SHARDS_DIR, size=INPUT_SIZE, shard_size=SHARD_SIZE):
+    samples, class_to_idx = list_samples(data_dir)
+    if not samples:
+        raise ValueError(f"No images found in {data_dir}")
+
+    # Build next to the destination and swap in at the end
+    staging_dir = out_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    shards = []
+    labels = np.empty(len(samples), dtype=np.int64)
+    for shard_number, start in enumerate(range(0, len(samples), shard_size)):
+        chunk = samples[start:start + shard_size]
+        filename = f"shard_{shard_number:05d}.npy"
+        shard = np.lib.format.open_memmap(
+            os.path.join(staging_dir, filename), mode="w+", dtype=np.uint8, shape=(len(chunk), size, size, 3)
+        )
+        for i, (path, label) in enumerate(chunk):
+            with open(path, "rb") as f:
+                shard[i] = to_array(decode_image(f.read(), size), size)
+            labels[start + i] = label
+        shard.flush()
+        del shard
+        shards.append({"file": filename, "count": len(chunk)})
+        print(f"Shard {filename}: {len(chunk)} images")
+
+    np.save(os.path.join(staging_dir, LABELS_FILENAME), labels)
+    with open(os.path.join(staging_dir, INDEX_FILENAME), "w") as f:
+        json.dump({
+            "classes": sorted(class_to_idx, key=class_to_idx.get),
+            "class_to_idx": class_to_idx,
+            "size": size,
+            "shards": shards,
+            "source_dir": os.path.abspath(data_dir),
+            "source_fingerprint": fingerprint(samples, f"size={size}"),
+        }, f, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging_dir, out_dir)
+    print(f"Packed {len(samples)} images from {data_dir} into {len(shards)} shard(s) in {out_dir}")
+    return out_dir
+
+
+def ensure_shards(data_dir, out_dir=SHARDS_DIR, size=INPUT_SIZE):
+    """Rebuilds the shards only if images were added, removed or modified."""
+    index_path = os.path.join(out_dir, INDEX_FILENAME)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        samples, _ = list_samples(data_dir)
+        if index.get("size") == size and index.get("source_fingerprint") == fingerprint(samples, f"size={size}"):
+            return out_dir
+    return build_shards(data_dir, out_dir, size)
+
+
+class ShardDataset(Dataset):
+    """
+    Dataset over packed shards. Images are sliced straight out of the memory
+    map (no decode, no copy until the float conversion) and returned as
+    normalized CHW float tensors, optionally with a random horizontal flip.
+    Exposes `classes`, `class_to_idx` and `fingerprint` like ImageFolder-based
+    code expects.
+    """
+
+    def __init__(self, shards_dir=SHARDS_DIR, augment=True):
+        with open(os.path.join(shards_dir, INDEX_FILENAME)) as f:
+            index = json.load(f)
+        self.shards_dir = shards_dir
+        self.augment = augment
+        self.classes = index["classes"]
+        self.class_to_idx = index["class_to_idx"]
+        self.size = index["size"]
+        self.fingerprint = index["source_fingerprint"]
+        self.shard_files = [shard["file"] for shard in index["shards"]]
+        self.offsets = np.cumsum([0] + [shard["count"] for shard in index["shards"]]).tolist()
+        self.labels = np.load(os.path.join(shards_dir, LABELS_FILENAME))
+        self.targets = self.labels.tolist()
+        self._mean = torch.tensor(MEAN).view(3, 1, 1)
+        self._std = torch.tensor(STD).view(3, 1, 1)
+        # Opened lazily so every DataLoader worker maps the files itself
+        self._shards = None
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def _open(self):
+        # Copy-on-write mapping: writable for torch.from_numpy, never written back
+        self._shards = [np.load(os.path.join(self.shards_dir, name), mmap_mode="c") for name in self.shard_files]
+
+    def __getitem__(self, index):
+        if self._shards is None:
+            self._open()
+        shard_number = bisect.bisect_right(self.offsets, index) - 1
+        array = self._shards[shard_number][index - self.offsets[shard_number]]
+
+        image = torch.from_numpy(array).permute(2, 0, 1).float().div_(255)
+        image = (image - self._mean) / self._std
+        if self.augment and torch.rand(1).item() < 0.5:
+            image = torch.flip(image, dims=[2])
+        return image, int(self.labels[index])
+
+    def __getstate__(self):
+        # Memory maps are not pickled to worker processes, they reopen them
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack dataset/<class>/ folders into memory-mapped shards")
+    parser.add_argument("--data", default="dataset")
+    parser.add_argument("--out", default=SHARDS_DIR)
+    parser.add_argument("--size", type=int, default=INPUT_SIZE)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args(argv)
+    build_shards(args.data, args.out, args.size, args.shard_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Open-vocabulary food recognition by embedding similarity.
+
+Reference photos of each food are turned into MobileNetV2 feature vectors and
+stored in an EmbeddingIndex. An upload is recognized by finding the closest
+references (cosine similarity), so a new food only needs a few reference
+images inserted at runtime, no retraining.
+
+The backbone weights are read from a local file written once by
+
+    python embedding_index.py --export-backbone
+
+and memory-mapped like the classifier weights, so API workers neither
+download them nor hold a private copy each.
+"""
+import argparse
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from torch import nn
+from torchvision import models
+
+from ml_backends import load_state_dict
+
+EMBEDDING_INDEX_PATH = os.getenv("ML_EMBEDDING_INDEX_PATH", "embedding_index.npz")
+# Optional approximate search (faiss HNSW) once the index holds this many vectors
+EMBEDDING_APPROX_MIN_SIZE = int(os.getenv("ML_EMBEDDING_APPROX_MIN_SIZE", "50000"))
+
+# The frozen ImageNet backbone shared by every classifier we train, so the
+# index stays valid when the classification head is retrained.
+BACKBONE_ID = "mobilenet_v2/IMAGENET1K_V2"
+# Local copy of that backbone's weights (model.features state dict)
+BACKBONE_WEIGHTS_PATH = os.getenv("ML_BACKBONE_WEIGHTS_PATH", "mobilenet_v2_backbone.pth")
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+
+def export_backbone(path=BACKBONE_WEIGHTS_PATH):
+    """Downloads the ImageNet MobileNetV2 weights and saves its feature extractor to `path`."""
+    model = models.mobilenet_v2(weights=models.MobileNet_V2_Weights.DEFAULT)
+    tmp_path = path + ".tmp"
+    torch.save(model.features.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def index_file_signature(path):
+    """Changes whenever `path` is rewritten (os.replace gives it a new inode)."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path`.lock, held across the API's worker processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class FeatureExtractor:
+    """Pooled MobileNetV2 features, L2-normalized, as float32 numpy rows."""
+
+    backbone_id = BACKBONE_ID
+
+    def __init__(self, device=None, weights_path=BACKBONE_WEIGHTS_PATH):
+        self.device = device or torch.device("cpu")
+        if not os.path.exists(weights_path):
+            raise FileNotFoundError(
+                f"Backbone weights {weights_path} not found, run 'python embedding_index.py --export-backbone'"
+            )
+        model = models.mobilenet_v2(weights=None)
+        state_dict, mapped = load_state_dict(weights_path, self.device)
+        model.features.load_state_dict(state_dict, assign=mapped)
+        self.features = model.features.to(self.device).eval()
+        self.dim = model.last_channel
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            features = self.features(batch.to(self.device))
+            features = nn.functional.adaptive_avg_pool2d(features, (1, 1)).flatten(1)
+            features = nn.functional.normalize(features, dim=1)
+        return features.cpu().numpy().astype(np.float32, copy=False)
+
+
+class EmbeddingIndex:
+    """
+    Growable matrix of L2-normalized embeddings with a label per row.
+    Search is an exact matrix-vector product; with faiss installed, an HNSW
+    index takes over past EMBEDDING_APPROX_MIN_SIZE rows. Writers take a
+    lock, readers work on a consistent snapshot (matrix view + row count).
+    `file_signature` identifies the file version the index was loaded from
+    or last saved to.
+    """
+
+    def __init__(self, dim, backbone_id=BACKBONE_ID):
+        self.dim = dim
+        self.backbone_id = backbone_id
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._count = 0
+        self.labels = []
+        self.food_ids = []
+        self._approx = None
+        self._lock = threading.Lock()
+        self.file_signature = None
+
+    def __len__(self):
+        return self._count
+
+    def add(self, embeddings, label, food_id=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+
+        with self._lock:
+            needed = self._count + len(embeddings)
+            if needed > self._matrix.shape[0]:
+                # Capacity doubling keeps inserts amortized O(1)
+                grown = np.empty((max(needed, 2 * self._matrix.shape[0], 64), self.dim), dtype=np.float32)
+                grown[:self._count] = self._matrix[:self._count]
+                self._matrix = grown
+            self._matrix[self._count:needed] = embeddings
+            self.labels.extend([label] * len(embeddings))
+            self.food_ids.extend([food_id] * len(embeddings))
+            self._count = needed
+
+            if self._approx is not None:
+                self._approx.add(embeddings)
+            elif faiss is not None and self._count >= EMBEDDING_APPROX_MIN_SIZE:
+                self._build_approx()
+
+    def _build_approx(self):
+        index = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.add(self._matrix[:self._count])
+        self._approx = index
+
+    def search(self, query, k=5):
+        """
+        Top-k distinct foods for one normalized query vector, as dicts with
+        food_name, food_id and cosine similarity of the best matching reference.
+        """
+        count = self._count
+        if count == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        # Several references per food: look a bit deeper, then keep the best per label
+        candidates = min(count, k * 8)
+
+        if self._approx is not None:
+            scores, rows = self._approx.search(query.reshape(1, -1), candidates)
+            ranked = [(int(r), float(s)) for r, s in zip(rows[0], scores[0]) if r >= 0]
+        else:
+            scores = self._matrix[:count] @ query
+            top = np.argpartition(-scores, candidates - 1)[:candidates] if candidates < count else np.arange(count)
+            top = top[np.argsort(-scores[top])]
+            ranked = [(int(r), float(scores[r])) for r in top]
+
+        results, seen = [], set()
+        for row, score in ranked:
+            label = self.labels[row]
+            if label in seen:
+                continue
+            seen.add(label)
+            results.append({"food_name": label, "food_id": self.food_ids[row], "similarity": round(score, 4)})
+            if len(results) == k:
+                break
+        return results
+
+    def stats(self):
+        return {
+            "vectors": self._count,
+            "foods": len(set(self.labels)),
+            "dim": self.dim,
+            "backbone": self.backbone_id,
+            "approximate": self._approx is not None,
+        }
+
+    def save(self, path=EMBEDDING_INDEX_PATH):
+        with self._lock:
+            count = self._count
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    embeddings=self._matrix[:count],
+                    labels=np.array(self.labels[:count], dtype=object),
+                    food_ids=np.array([-1 if i is None else i for i in self.food_ids[:count]], dtype=np.int64),
+                    backbone_id=np.array(self.backbone_id),
+                )
+            os.replace(tmp_path, path)
+            self.file_signature = index_file_signature(path)
+
+    @classmethod
+    def load(cls, path, dim, backbone_id=BACKBONE_ID):
+        index = cls(dim, backbone_id)
+        index.file_signature = index_file_signature(path)
+        if index.file_signature is None:
+            return index
+        with np.load(path, allow_pickle=True) as data:
+            if str(data["backbone_id"]) != backbone_id:
+                print(f"Warning: {path} was built with {data['backbone_id']}, ignoring it")
+                return index
+            embeddings = data["embeddings"]
+            index._matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+            index._count = len(embeddings)
+            index.labels = [str(label) for label in data["labels"]]
+            index.food_ids = [None if i < 0 else int(i) for i in data["food_ids"]]
+        if faiss is not None and index._count >= EMBEDDING_APPROX_MIN_SIZE:
+            index._build_approx()
+        return index
+
+
+def add_and_save(index, path, embeddings, label, food_id=None):
+    """
+    Adds reference embeddings and persists them while holding the file lock.
+    If another worker rewrote the file since `index` was loaded, the file is
+    reloaded first so its additions are kept. Returns the up-to-date index,
+    which may be a new object.
+    """
+    with file_lock(path):
+        if index.file_signature != index_file_signature(path):
+            index = EmbeddingIndex.load(path, index.dim, index.backbone_id)
+        index.add(embeddings, label, food_id)
+        index.save(path)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding index utilities")
+    parser.add_argument("--export-backbone", action="store_true",
+                        help="download the ImageNet backbone once and save it locally")
+    parser.add_argument("--output", default=BACKBONE_WEIGHTS_PATH)
+    args = parser.parse_args(argv)
+    if not args.export_backbone:
+        parser.print_help()
+        return 1
+    print(f"Backbone weights written to {export_backbone(args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""
+Ranked, accent-insensitive food search.
+
+The foods table is almost read-only, so searches are answered from an
+in-memory CatalogueSnapshot (columns + trigram and prefix indexes) that is
+refreshed in the background when the catalogue changes. Catalogues too
+large for memory (FOOD_CATALOGUE_MAX_ROWS), or FOOD_SEARCH_BACKEND=postgres,
+are searched in PostgreSQL through a trigram GIN index on
+f_unaccent(lower(name)) (extensions pg_trgm + unaccent, installed by
+`python database.py`), so substring and fuzzy lookups never scan `foods`.
+
+Both rank exact name > first word > name prefix > word prefix > substring >
+similarity.
+"""
+import hashlib
+import heapq
+import math
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from sqlalchemy import text
+
+import catalogue
+import models
+from nutrition_index import normalize_name
+
+# auto: in-memory catalogue up to CATALOGUE_MAX_ROWS, else the Postgres trigram index
+# memory: always in memory, postgres: always the Postgres index when installed
+SEARCH_BACKEND = os.getenv("FOOD_SEARCH_BACKEND", "auto")
+# Minimum trigram similarity for fuzzy matches (pg_trgm's default threshold)
+SEARCH_MIN_SIMILARITY = float(os.getenv("FOOD_SEARCH_MIN_SIMILARITY", "0.3"))
+# Larger catalogues are searched through the Postgres index instead of memory
+CATALOGUE_MAX_ROWS = int(os.getenv("FOOD_CATALOGUE_MAX_ROWS", "500000"))
+
+NAN = float("nan")
+
+# unaccent() is only STABLE, an IMMUTABLE wrapper is required to index it
+POSTGRES_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_foods_name_trgm
+    ON foods USING gin (f_unaccent(lower(name)) gin_trgm_ops)
+    """,
+]
+
+# Same sort key as CatalogueSnapshot: (match class, -similarity, name length, id),
+# compared as a row value so a page starts right after the previous one's last key
+POSTGRES_SEARCH = text("""
+    SELECT id, match, neg_similarity, name_length FROM (
+        SELECT
+            id,
+            CASE
+                WHEN folded = :query THEN 0
+                WHEN folded LIKE :first_word THEN 1
+                WHEN folded LIKE :prefix THEN 2
+                WHEN folded LIKE :word_prefix THEN 3
+                WHEN folded LIKE :contains THEN 4
+                ELSE 5
+            END AS match,
+            CASE WHEN folded LIKE :contains THEN 0.0
+                 ELSE -similarity(folded, :query)::float8 END AS neg_similarity,
+            length(name) AS name_length
+        FROM (
+            SELECT id, name, f_unaccent(lower(name)) AS folded FROM foods
+            WHERE f_unaccent(lower(name)) LIKE :contains
+               OR (f_unaccent(lower(name)) % :query
+                   AND similarity(f_unaccent(lower(name)), :query) >= :min_similarity)
+        ) AS matches
+    ) AS ranked
+    WHERE (match, neg_similarity, name_length, id) > (:after_match, :after_similarity, :after_length, :after_id)
+    ORDER BY match, neg_similarity, name_length, id
+    LIMIT :limit
+""")
+
+# `%` uses the GIN index but filters on pg_trgm.similarity_threshold: lower it to
+# SEARCH_MIN_SIMILARITY for the transaction, the explicit similarity() test above
+# then applies the same cut-off as the in-memory search whatever the server default
+POSTGRES_SIMILARITY_THRESHOLD = text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)")
+
+POSTGRES_LIST = text("""
+    SELECT id FROM foods WHERE id > :after_id ORDER BY id LIMIT :limit
+""")
+
+# Sort key preceding every result, i.e. the first page
+FIRST_KEY = (-1, 0.0, 0, 0)
+
+
+def install(engine):
+    """Creates the Postgres extensions and trigram index; no-op on other databases."""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as connection:
+        for statement in POSTGRES_SETUP:
+            connection.execute(text(statement))
+    return True
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def trigrams(folded):
+    """pg_trgm-style trigrams: every word padded with two leading and one trailing space."""
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def rank(folded_name, query):
+    """Match class of a folded name for a folded query, lower is better, None if no match."""
+    if folded_name == query:
+        return 0
+    if folded_name.startswith(query):
+        # "pate de campagne" before "pates completes" for "pate"
+        return 1 if folded_name[len(query)] == " " else 2
+    if any(word.startswith(query) for word in folded_name.split()):
+        return 3
+    if query in folded_name:
+        return 4
+    return None
+
+
+# Columns served by /api/foods/search, in response order
+RESPONSE_COLUMNS = ("name", "grams", "category", "calories", "protein", "carbs", "fat")
+NUMERIC_COLUMNS = ("grams", "calories", "protein", "carbs", "fat")
+
+
+class CatalogueSnapshot:
+    """
+    Immutable column-oriented copy of the foods table plus its search index.
+    Numbers live in array('d') columns (NaN for NULL), names and categories in
+    plain lists; each food is a row number. Trigram posting lists (array('i'))
+    give fuzzy/substring candidates, a sorted (word, row) array gives prefix
+    matches for typeahead. `etag` changes with the catalogue content.
+    """
+
+    def __init__(self, rows, etag):
+        self.etag = etag
+        self.ids = array("q")
+        self.names = []
+        self.categories = []
+        self.numbers = {column: array("d") for column in NUMERIC_COLUMNS}
+        self.folded = []  # accent- and case-folded names
+        self.gram_counts = array("H")
+        self.postings = {}  # trigram -> array('i') of rows
+        words = []
+
+        categories = {}
+        for food_id, name, category, *numbers in rows:
+            row = len(self.ids)
+            self.ids.append(food_id)
+            self.names.append(name)
+            # Few distinct categories: share one string object per value
+            self.categories.append(categories.setdefault(category, category))
+            for column, value in zip(NUMERIC_COLUMNS, numbers):
+                self.numbers[column].append(NAN if value is None else value)
+            folded = normalize_name(name)
+            self.folded.append(folded)
+            grams = trigrams(folded)
+            self.gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self.postings.setdefault(gram, array("i")).append(row)
+            words.extend((word, row) for word in set(folded.split()))
+        words.sort()
+        self.words = words
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix_rows(self, query):
+        rows = set()
+        words = self.words
+        position = bisect_left(words, (query,))
+        while position < len(words) and words[position][0].startswith(query):
+            rows.add(words[position][1])
+            position += 1
+        return rows
+
+    def search(self, query, limit=20, after=FIRST_KEY):
+        """
+        (sort key, row) pairs best matching `query` (already folded), best
+        first, starting after the sort key `after`. Keys are
+        (match class, -similarity, name length, id); every page scores the
+        same candidates, so deep pages cost the same as the first one.
+        """
+        after = tuple(after)
+        if not query:
+            start = bisect_right(self.ids, after[3])
+            return [((0, 0.0, 0, self.ids[row]), row) for row in range(start, min(start + limit, len(self)))]
+
+        def keyed(match, neg_similarity, row):
+            return (match, neg_similarity, len(self.names[row] or ""), self.ids[row]), row
+
+        # Typeahead fast path: enough name/word prefix matches, no trigram scan
+        prefix_rows = self._prefix_rows(query)
+        candidates = [keyed(rank(self.folded[row], query), 0.0, row) for row in prefix_rows]
+        candidates = [candidate for candidate in candidates if candidate[0] > after]
+        if len(candidates) < limit and len(query) < 3:
+            # Too short for trigrams: plain substring scan, as the former ILIKE search
+            for row, folded in enumerate(self.folded):
+                if query in folded and row not in prefix_rows:
+                    candidate = keyed(rank(folded, query), 0.0, row)
+                    if candidate[0] > after:
+                        candidates.append(candidate)
+        elif len(candidates) < limit:
+            query_grams = trigrams(query)
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self.postings.get(gram, ()))
+            for row, count in shared.items():
+                if row in prefix_rows:
+                    continue
+                match = rank(self.folded[row], query)
+                if match is not None:
+                    candidate = keyed(match, 0.0, row)
+                else:
+                    # Jaccard similarity of the trigram sets, as pg_trgm's similarity()
+                    similarity = count / (len(query_grams) + self.gram_counts[row] - count)
+                    if similarity < SEARCH_MIN_SIMILARITY:
+                        continue
+                    candidate = keyed(5, -similarity, row)
+                if candidate[0] > after:
+                    candidates.append(candidate)
+        return heapq.nsmallest(limit, candidates)
+
+    def to_dict(self, row):
+        food = {"name": self.names[row], "category": self.categories[row]}
+        for column in NUMERIC_COLUMNS:
+            value = self.numbers[column][row]
+            food[column] = None if math.isnan(value) else value
+        return {column: food[column] for column in RESPONSE_COLUMNS}
+
+
+def _catalogue_etag(rows):
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(repr(row).encode())
+    return f'"{digest.hexdigest()[:16]}"'
+
+
+class FoodSearchIndex:
+    """
+    Holds the current CatalogueSnapshot. The first search builds it; after
+    that the catalogue poller swaps in a new snapshot only when the
+    catalogue changed. Catalogues over `max_rows` are not loaded (search then
+    goes to the Postgres index).
+    """
+
+    def __init__(self, poller=catalogue.poller, max_rows=CATALOGUE_MAX_ROWS):
+        self.poller = poller
+        self.max_rows = max_rows
+        self.snapshot = None
+        self.too_large = False
+        self.version = 0
+        poller.subscribe(self._rebuild)
+
+    def _rebuild(self, db, signature):
+        self.too_large = self.max_rows > 0 and signature[0] > self.max_rows
+        if self.too_large:
+            self.snapshot = None
+            return
+        rows = db.query(
+            models.Food.id, models.Food.name, models.Food.category, models.Food.grams,
+            models.Food.calories, models.Food.protein, models.Food.carbs, models.Food.fat,
+        ).order_by(models.Food.id).all()
+        # Readers keep using the previous snapshot until this swap
+        self.snapshot = CatalogueSnapshot(rows, _catalogue_etag(rows))
+        self.version += 1
+
+    def refresh(self, force=False):
+        """Rebuilds the snapshot if the catalogue changed. Returns True if it did."""
+        return self.poller.check(force, only=self._rebuild)
+
+    def current(self):
+        """The snapshot to serve from, or None if the catalogue can't be held in memory."""
+        if self.poller.signature(self._rebuild) is None:
+            self.refresh()
+        else:
+            self.poller.maybe_check_async()
+        return self.snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "foods": len(snapshot) if snapshot else 0,
+            "trigrams": len(snapshot.postings) if snapshot else 0,
+            "etag": snapshot.etag if snapshot else None,
+            "too_large": self.too_large,
+            "version": self.version,
+            "last_error": self.poller.errors.get(self._rebuild),
+        }
+
+
+search_index = FoodSearchIndex(max_rows=0 if SEARCH_BACKEND == "memory" else CATALOGUE_MAX_ROWS)
+_postgres_ready = None
+
+
+def _postgres_index_installed(db):
+    """Whether the trigram index is installed, checked once per process."""
+    global _postgres_ready
+    if db.bind.dialect.name != "postgresql":
+        return False
+    if _postgres_ready is None:
+        installed = db.execute(text(
+            "SELECT count(*) FROM pg_indexes WHERE tablename = 'foods' AND indexname = 'ix_foods_name_trgm'"
+        )).scalar()
+        _postgres_ready = bool(installed)
+        if not _postgres_ready:
+            print("Food search: trigram index missing (run 'python database.py'), using the in-memory index")
+    return _postgres_ready
+
+
+def catalogue_snapshot(db):
+    """
+    The in-memory catalogue to answer searches from, or None when they should
+    go to the Postgres trigram index (FOOD_SEARCH_BACKEND=postgres, or a
+    catalogue over CATALOGUE_MAX_ROWS).
+    """
+    if SEARCH_BACKEND == "postgres" and _postgres_index_installed(db):
+        return None
+    snapshot = search_index.current()
+    if snapshot is None and not _postgres_index_installed(db):
+        # Too large for the default budget, but there is no index to fall back to
+        search_index.max_rows = 0
+        search_index.refresh(force=True)
+        snapshot = search_index.snapshot
+    return snapshot
+
+
+def search_food_ids(db, query, limit=20, after=FIRST_KEY):
+    """(sort key, food id) pairs best matching `query`, after the sort key `after`."""
+    snapshot = catalogue_snapshot(db)
+    folded = normalize_name(query)
+    if snapshot is not None:
+        return [(key, snapshot.ids[row]) for key, row in snapshot.search(folded, limit, after)]
+
+    if not folded:
+        rows = db.execute(POSTGRES_LIST, {"after_id": after[3], "limit": limit})
+        return [((0, 0.0, 0, food_id), food_id) for food_id, in rows]
+
+    escaped = _escape_like(folded)
+    db.execute(POSTGRES_SIMILARITY_THRESHOLD, {"threshold": str(SEARCH_MIN_SIMILARITY)})
+    rows = db.execute(POSTGRES_SEARCH, {
+        "query": folded,
+        "contains": f"%{escaped}%",
+        "first_word": f"{escaped} %",
+        "prefix": f"{escaped}%",
+        "word_prefix": f"% {escaped}%",
+        "min_similarity": SEARCH_MIN_SIMILARITY,
+        "after_match": after[0],
+        "after_similarity": after[1],
+        "after_length": after[2],
+        "after_id": after[3],
+        "limit": limit,
+    })
+    return [((match, neg_similarity, length, food_id), food_id) for food_id, match, neg_similarity, length in rows]
+
+
+def search_foods(db, query, limit=20, after=FIRST_KEY):
+    """Foods matching `query`, best first, as (sort key, Food) pairs."""
+    keyed_ids = search_food_ids(db, query, limit, after)
+    if not keyed_ids:
+        return []
+    ids = [food_id for _, food_id in keyed_ids]
+    foods = {food.id: food for food in db.query(models.Food).filter(models.Food.id.in_(ids))}
+    return [(key, foods[food_id]) for key, food_id in keyed_ids if food_id in foods]
@@ -0,0 +1,41 @@
+"""
+Production server: several uvicorn workers sharing one copy of the model.
+
+    gunicorn -c gunicorn_conf.py main:app
+
+The app (and with it the recognition model) is imported once in the master
+process and the workers are forked from it, so the torch runtime and the
+weights are shared copy-on-write instead of being loaded by every worker.
+The weights themselves are memory-mapped from the .pth (ML_MMAP_WEIGHTS), so
+they also stay shared across reloads. Compare with
+`python measure_worker_memory.py`.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("ML_PRELOAD", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+if preload_app:
+    # Inference in the master would start torch's thread pool, which doesn't
+    # survive a fork; workers warm the model up themselves in post_fork
+    os.environ.setdefault("ML_WARMUP_ON_LOAD", "0")
+
+
+def when_ready(server):
+    # The app only loads the model lazily; load it here, before workers are forked
+    if preload_app:
+        import ml_loader
+        ml_loader.get_food_service()
+
+
+def post_fork(server, worker):
+    # Pooled connections opened by the master (nutrition index) belong to it
+    from database import engine
+    engine.dispose(close=False)
+
+    import ml_loader
+    if ml_loader.is_loaded():
+        ml_loader.get_food_service().warm_up()
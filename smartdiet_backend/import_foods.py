@@ -0,0 +1,351 @@
+"""
+Bulk import of the foods catalogue from a large CSV/TSV or JSONL file
+(optionally .gz), e.g. an OpenFoodFacts export:
+
+    python import_foods.py foods.csv
+    python import_foods.py en.openfoodfacts.org.products.csv.gz --batch-size 20000
+    python import_foods.py foods.jsonl --restart
+
+Records are streamed, normalized (names, per-100g nutrition, serving sizes
+converted to grams) and appended to the foods_import_staging table in
+batches: COPY on PostgreSQL, executemany elsewhere. Every batch commits
+together with the number of records consumed, so an interrupted import
+resumes where it stopped. Once the whole file is staged, foods are upserted
+by name in a single transaction (latest record wins) and staging is cleared.
+
+Both the native column names (name, calories, grams, ...) and the
+OpenFoodFacts ones (product_name, energy-kcal_100g, proteins_100g, ...) are
+understood.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, Float, Integer, MetaData, String, Table, func, select, text
+
+import catalogue
+from database import engine
+
+BATCH_SIZE = 10000
+PROGRESS_EVERY = 100000
+
+# Kept apart from Base.metadata: only this command creates them
+import_metadata = MetaData()
+staging_table = Table(
+    "foods_import_staging", import_metadata,
+    Column("line_no", BigInteger, primary_key=True),
+    Column("name", String(200), nullable=False, index=True),
+    Column("category", String(100)),
+    Column("calories", Float),
+    Column("protein", Float),
+    Column("carbs", Float),
+    Column("fat", Float),
+    Column("fiber", Float),
+    Column("grams", Float),
+    Column("serving_size", String(50)),
+    Column("serving_unit", String(20)),
+)
+state_table = Table(
+    "foods_import_state", import_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("source", String(500), nullable=False),
+    Column("fingerprint", String(100), nullable=False),
+    Column("records_done", BigInteger, nullable=False, default=0),
+    Column("rows_staged", BigInteger, nullable=False, default=0),
+    Column("phase", String(20), nullable=False),  # staging -> done
+    Column("updated_at", String(40)),
+)
+STAGING_COLUMNS = [column.name for column in staging_table.columns]
+FOOD_COLUMNS = STAGING_COLUMNS[1:]
+
+# Source field -> our column, first present non-empty field wins
+FIELD_ALIASES = {
+    "name": ("name", "product_name_fr", "product_name", "generic_name"),
+    "category": ("category", "main_category_fr", "main_category", "categories"),
+    "calories": ("calories", "energy-kcal_100g", "energy_kcal_100g"),
+    "energy_kj": ("energy-kj_100g", "energy_100g"),
+    "protein": ("protein", "proteins_100g"),
+    "carbs": ("carbs", "carbohydrates_100g"),
+    "fat": ("fat", "fat_100g"),
+    "fiber": ("fiber", "fiber_100g"),
+    "grams": ("grams",),
+    "serving_size": ("serving_size",),
+    "serving_unit": ("serving_unit",),
+}
+
+# Everything is stored in grams; liquids are counted 1 ml = 1 g
+UNIT_TO_GRAMS = {
+    "g": 1.0, "gr": 1.0, "gram": 1.0, "grams": 1.0, "gramme": 1.0, "grammes": 1.0,
+    "kg": 1000.0, "mg": 0.001, "µg": 0.000001, "mcg": 0.000001,
+    "oz": 28.3495, "lb": 453.592, "lbs": 453.592,
+    "ml": 1.0, "cl": 10.0, "dl": 100.0, "l": 1000.0,
+}
+QUANTITY_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(µg|mcg|mg|kg|grammes?|grams?|gr|g|oz|lbs?|ml|cl|dl|l)\b", re.I)
+KJ_PER_KCAL = 4.184
+
+
+def parse_quantity(value):
+    """'1 cup (240 ml)' -> 240.0, '30g' -> 30.0, '2 oz' -> 56.699; None if no unit is found."""
+    if value is None:
+        return None
+    match = QUANTITY_PATTERN.search(str(value))
+    if match is None:
+        return None
+    amount = float(match.group(1).replace(",", "."))
+    return round(amount * UNIT_TO_GRAMS[match.group(2).lower()], 3)
+
+
+def _number(value):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+    return number if number == number and abs(number) < 1e9 else None  # drops NaN / garbage
+
+
+def _field(record, key):
+    for alias in FIELD_ALIASES[key]:
+        value = record.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def normalize(record):
+    """Source record -> staging row dict (without line_no), or None if unusable."""
+    name = _field(record, "name")
+    name = " ".join(str(name).split()) if name else ""
+    if not name:
+        return None
+
+    category = _field(record, "category")
+    if category:
+        # OpenFoodFacts lists categories general -> specific, "en:" prefixed
+        category = str(category).split(",")[-1].split(":")[-1].strip()
+
+    calories = _number(_field(record, "calories"))
+    if calories is None:
+        energy_kj = _number(_field(record, "energy_kj"))
+        calories = round(energy_kj / KJ_PER_KCAL, 1) if energy_kj is not None else None
+
+    # Native rows give nutrition per `grams`; anything else is per 100 g
+    grams = _number(_field(record, "grams"))
+    if grams is None:
+        grams = parse_quantity(_field(record, "grams")) or 100.0
+
+    serving_size = _field(record, "serving_size")
+    serving_unit = _field(record, "serving_unit")
+    if serving_size is not None and serving_unit is None:
+        serving_grams = parse_quantity(serving_size)
+        if serving_grams is not None:
+            serving_size, serving_unit = f"{serving_grams:g}", "g"
+    elif serving_size is not None and serving_unit is not None and str(serving_unit).lower() in UNIT_TO_GRAMS:
+        amount = _number(serving_size)
+        if amount is not None:
+            serving_size, serving_unit = f"{amount * UNIT_TO_GRAMS[str(serving_unit).lower()]:g}", "g"
+
+    return {
+        "name": name[:200],
+        "category": category[:100] if category else None,
+        "calories": calories,
+        "protein": _number(_field(record, "protein")),
+        "carbs": _number(_field(record, "carbs")),
+        "fat": _number(_field(record, "fat")),
+        "fiber": _number(_field(record, "fiber")),
+        "grams": grams,
+        "serving_size": str(serving_size)[:50] if serving_size is not None else None,
+        "serving_unit": str(serving_unit)[:20] if serving_unit is not None else None,
+    }
+
+
+def read_records(path):
+    """Streams dict records from CSV/TSV or JSONL, plain or gzipped."""
+    opener = gzip.open if path.endswith(".gz") else open
+    stem = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", errors="replace", newline="") as f:
+        if stem.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield {}
+            return
+        # OpenFoodFacts dumps are tab-separated despite their .csv name
+        header = f.readline()
+        delimiter = "\t" if "\t" in header else ","
+        csv.field_size_limit(sys.maxsize)
+        fieldnames = next(csv.reader([header], delimiter=delimiter))
+        # Tab-separated dumps don't quote fields, stray quotes must stay literal
+        quoting = csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL
+        yield from csv.DictReader(f, fieldnames=fieldnames, delimiter=delimiter, quoting=quoting)
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _copy_rows(connection, rows):
+    """PostgreSQL COPY of staging rows through the connection's own transaction."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in STAGING_COLUMNS])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY foods_import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def load_state(connection, source):
+    return connection.execute(select(state_table).where(state_table.c.source == source)).mappings().first()
+
+
+def stage(path, batch_size=BATCH_SIZE, restart=False):
+    """Streams `path` into staging, resuming after the last committed batch. Returns rows staged."""
+    import_metadata.create_all(engine)
+    source = os.path.abspath(path)
+    current = fingerprint(path)
+    use_copy = engine.dialect.name == "postgresql"
+
+    with engine.begin() as connection:
+        state = load_state(connection, source)
+        other = connection.execute(
+            select(func.count()).select_from(state_table)
+            .where(state_table.c.source != source, state_table.c.phase != "done")
+        ).scalar()
+        if other and not restart:
+            raise RuntimeError("Another import is in progress, finish it or rerun with --restart")
+        if not restart and state is not None and state["phase"] == "done" and state["fingerprint"] == current:
+            print(f"{path} was already imported (use --restart to import it again)")
+            return None
+        if restart or state is None or state["fingerprint"] != current or state["phase"] == "done":
+            # Fresh start: the file changed, or nothing to resume
+            connection.execute(staging_table.delete())
+            connection.execute(state_table.delete())
+            connection.execute(state_table.insert().values(
+                source=source, fingerprint=current, records_done=0, rows_staged=0,
+                phase="staging", updated_at=datetime.utcnow().isoformat(),
+            ))
+            records_done = rows_staged = 0
+        else:
+            records_done, rows_staged = state["records_done"], state["rows_staged"]
+            print(f"Resuming {path} after {records_done} records ({rows_staged} rows staged)")
+
+    start = time.perf_counter()
+    new_rows = 0
+    last_report = rows_staged
+    batch = []
+    record_no = 0
+
+    def flush():
+        nonlocal new_rows, last_report
+        with engine.begin() as connection:
+            if batch:
+                if use_copy:
+                    _copy_rows(connection, batch)
+                else:
+                    connection.execute(staging_table.insert(), batch)
+            # Committed with the batch: a crash never loses or repeats records
+            connection.execute(state_table.update().where(state_table.c.source == source).values(
+                records_done=record_no, rows_staged=rows_staged + new_rows + len(batch),
+                updated_at=datetime.utcnow().isoformat(),
+            ))
+        new_rows += len(batch)
+        batch.clear()
+        if rows_staged + new_rows - last_report >= PROGRESS_EVERY:
+            last_report = rows_staged + new_rows
+            elapsed = time.perf_counter() - start
+            print(f"  {last_report} rows staged, {new_rows / elapsed:,.0f} rows/s")
+
+    for record_no, record in enumerate(read_records(path), start=1):
+        if record_no <= records_done:
+            continue
+        row = normalize(record) if isinstance(record, dict) else None
+        if row is None:
+            continue
+        row["line_no"] = record_no
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - start
+    rate = new_rows / elapsed if elapsed else 0.0
+    print(f"Staged {new_rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/s), {rows_staged + new_rows} in total")
+    return rows_staged + new_rows
+
+
+# Latest record per name wins
+LATEST_STAGED = "SELECT max(line_no) FROM foods_import_staging GROUP BY name"
+UPDATE_FOODS = f"""
+    UPDATE foods SET {', '.join(f'{column} = s.{column}' for column in FOOD_COLUMNS[1:])}
+    FROM foods_import_staging AS s
+    WHERE foods.name = s.name AND s.line_no IN ({LATEST_STAGED})
+"""
+INSERT_FOODS = f"""
+    INSERT INTO foods ({', '.join(FOOD_COLUMNS)})
+    SELECT {', '.join(f's.{column}' for column in FOOD_COLUMNS)}
+    FROM foods_import_staging AS s
+    WHERE s.line_no IN ({LATEST_STAGED})
+      AND NOT EXISTS (SELECT 1 FROM foods AS f WHERE f.name = s.name)
+"""
+
+
+def merge(path):
+    """Upserts staged rows into foods by name in one transaction, then clears staging."""
+    source = os.path.abspath(path)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        updated = connection.execute(text(UPDATE_FOODS)).rowcount
+        inserted = connection.execute(text(INSERT_FOODS)).rowcount
+        connection.execute(staging_table.delete())
+        # Search snapshots and nutrition indexes rebuild on their next poll,
+        # even for an import that only updated existing foods
+        catalogue.bump_version(connection)
+        connection.execute(state_table.update().where(state_table.c.source == source).values(
+            phase="done", updated_at=datetime.utcnow().isoformat(),
+        ))
+    elapsed = time.perf_counter() - start
+    print(f"Merged into foods in {elapsed:.1f}s: {inserted} inserted, {updated} updated")
+    return inserted, updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a CSV/JSONL foods file into the foods table")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="discard any partial import and start over")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        staged = stage(args.path, args.batch_size, args.restart)
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    if staged is None:
+        return 0
+    inserted, updated = merge(args.path)
+    elapsed = time.perf_counter() - start
+    print(f"Import finished in {elapsed:.1f}s ({(inserted + updated) / elapsed if elapsed else 0:,.0f} foods/s overall)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
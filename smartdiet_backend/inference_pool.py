@@ -0,0 +1,82 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated threads for CPU-bound inference so the event loop stays responsive
+INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "16"))
+# Requests allowed to wait for a free worker before we start rejecting
+INFERENCE_QUEUE_SIZE = int(os.getenv("ML_INFERENCE_QUEUE_SIZE", "32"))
+# Seconds suggested to clients in the Retry-After header when saturated
+INFERENCE_RETRY_AFTER = int(os.getenv("ML_INFERENCE_RETRY_AFTER", "2"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the inference pool has no free worker nor queue slot."""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference pool is saturated")
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """
+    Bounded thread pool for running blocking inference from async handlers.
+    At most `workers + max_pending` calls are admitted at once; anything beyond
+    that fails immediately with PoolSaturatedError instead of queueing.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, max_pending=INFERENCE_QUEUE_SIZE,
+                 retry_after=INFERENCE_RETRY_AFTER):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Created on first use so each forked worker process gets its own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="ml-inference"
+                    )
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        """Admits `fn(*args)` into the pool and returns a concurrent Future."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturatedError(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # The slot is held until the work really finishes, even if the
+        # awaiting request is cancelled (e.g. client disconnect).
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+        }
+
+
+inference_pool = InferencePool()
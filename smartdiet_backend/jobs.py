@@ -0,0 +1,143 @@
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+from inference_pool import InferencePool, INFERENCE_RETRY_AFTER
+
+# Threads running recognition jobs, separate from the synchronous endpoints' pool
+JOB_WORKERS = int(os.getenv("ML_JOB_WORKERS", "4"))
+# Jobs accepted while all job workers are busy; only the upload bytes wait here
+JOB_QUEUE_SIZE = int(os.getenv("ML_JOB_QUEUE_SIZE", "128"))
+# Finished jobs are kept this long for polling, and at most JOB_MAX_ENTRIES of them
+JOB_TTL_SECONDS = float(os.getenv("ML_JOB_TTL_SECONDS", "300"))
+JOB_MAX_ENTRIES = int(os.getenv("ML_JOB_MAX_ENTRIES", "1000"))
+# Upper bound for a single long-poll request
+JOB_MAX_WAIT_SECONDS = float(os.getenv("ML_JOB_MAX_WAIT_SECONDS", "30"))
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = "queued"  # queued -> running -> done | failed
+    submitted_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    finished_at: Optional[str] = None
+    result: Any = None
+    error: Optional[str] = None
+    expires_at: Optional[float] = None  # monotonic, set when the job finishes
+    future: Any = field(default=None, repr=False)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class JobStore:
+    """
+    Recognition jobs run on a bounded worker pool, with their results kept in
+    memory for polling. Finished jobs expire after `ttl` seconds and the
+    oldest finished ones are dropped beyond `max_entries`. Submitting fails
+    with PoolSaturatedError once the pool's queue is full.
+
+    The store lives in the worker process that accepted the job: with several
+    workers, polls must reach the same one (sticky routing, or one worker
+    dedicated to /api/ai/recognize-food/jobs).
+    """
+
+    def __init__(self, pool, max_entries=JOB_MAX_ENTRIES, ttl=JOB_TTL_SECONDS):
+        self.pool = pool
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._jobs = OrderedDict()  # id -> Job, in submission order
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+
+    def submit(self, fn, *args):
+        """Queues `fn(*args)` and returns the Job immediately."""
+        job = Job(id=secrets.token_urlsafe(16))
+        with self._lock:
+            self._evict()
+            self._jobs[job.id] = job
+        try:
+            job.future = self.pool.submit(self._run, job, fn, args)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise
+        self.submitted += 1
+        return job
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        try:
+            job.result = fn(*args)
+            # predict() reports an unreadable image or a missing model as {"error": ...}
+            job.error = job.result.get("error") if isinstance(job.result, dict) else None
+        except Exception as e:
+            job.error = str(e)
+        job.finished_at = datetime.utcnow().isoformat()
+        job.expires_at = time.monotonic() + self.ttl
+        if job.error is not None:
+            job.status = "failed"
+            self.failed += 1
+        else:
+            job.status = "done"
+
+    def _evict(self):
+        now = time.monotonic()
+        for job_id in [j.id for j in self._jobs.values() if j.expires_at is not None and j.expires_at < now]:
+            del self._jobs[job_id]
+        if len(self._jobs) >= self.max_entries:
+            for job_id in [j.id for j in self._jobs.values() if j.finished][:len(self._jobs) - self.max_entries + 1]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.expires_at is not None and job.expires_at < time.monotonic():
+                del self._jobs[job_id]
+                return None
+            return job
+
+    async def wait(self, job, timeout):
+        """Long-poll: returns once the job has finished or after `timeout` seconds."""
+        if job.finished or timeout <= 0 or job.future is None:
+            return job
+        # asyncio.wait never cancels the job itself, even when the client goes away
+        await asyncio.wait({asyncio.wrap_future(job.future)}, timeout=min(timeout, JOB_MAX_WAIT_SECONDS))
+        return job
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            return {
+                "stored": len(self._jobs),
+                "pending": pending,
+                "submitted": self.submitted,
+                "failed": self.failed,
+                "pool": self.pool.stats(),
+            }
+
+
+recognition_jobs = JobStore(
+    InferencePool(workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, retry_after=INFERENCE_RETRY_AFTER)
+)
@@ -1,29 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import timedelta
+from typing import List, Optional
+from datetime import datetime, timedelta
+import os
 import uvicorn
-import joblib
-import pandas as pd
 from pydantic import BaseModel
 from pathlib import Path
 
 from database import get_db, init_db
 import models
 import schemas
+import catalogue
 import crud
+import food_search
+from nutrition_index import normalize_name
+from pagination import decode_cursor, encode_cursor, next_cursor, page_response, page_responses, page_size
+from responses import FastJSONResponse
 from auth import (
     create_access_token,
     get_current_user,
+    require_admin,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 # from ai_recommendations import AIRecommendations  # Not used - AI page is coming soon
 
-# =========================
-# Initialiser la base de données
-# =========================
-init_db()
+# Le schéma est créé par une étape explicite (`python database.py`), pas à l'import
+
+# Durée (secondes) pendant laquelle le client réutilise une recherche sans revalider
+FOOD_SEARCH_MAX_AGE = int(os.getenv("FOOD_SEARCH_MAX_AGE", "60"))
 
 app = FastAPI(
     title="SmartDiet API",
@@ -57,8 +62,52 @@ app = FastAPI(
 # =========================
 # Reconnaissance Banane (PoC)
 # =========================
-from fastapi import UploadFile, File
-from ml_service import food_service
+from fastapi import UploadFile, File, Form
+import ml_loader
+from ml_loader import get_food_service
+import model_registry
+from inference_pool import inference_pool, PoolSaturatedError
+from jobs import JOB_MAX_WAIT_SECONDS, recognition_jobs
+from uploads import (
+    BATCH_MAX_FILES,
+    BATCH_MAX_PAYLOAD_BYTES,
+    UPLOAD_MAX_BYTES,
+    UploadLimitMiddleware,
+    extract_archive,
+    is_archive,
+    read_upload,
+)
+
+
+@app.on_event("startup")
+def start_background_loading():
+    # Le modèle se charge en arrière-plan, les routes CRUD répondent déjà
+    ml_loader.start_background_warmup()
+    # Catalogue des aliments chargé en mémoire avant la première recherche
+    catalogue.poller.maybe_check_async()
+
+
+def call_food_service(method, *args):
+    return getattr(get_food_service(), method)(*args)
+
+
+async def run_inference(method, *args):
+    """Exécute l'inférence hors de la boucle asyncio (503 si le pool est saturé)"""
+    if ml_loader.is_loading():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Modèle de reconnaissance en cours de chargement, réessayez plus tard",
+            headers={"Retry-After": str(inference_pool.retry_after)},
+        )
+    try:
+        return await inference_pool.run(call_food_service, method, *args)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service de reconnaissance saturé, réessayez plus tard",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
 
 @app.post("/api/ai/recognize-banana")
 async def recognize_banana(file: UploadFile = File(...)):
@@ -67,13 +116,14 @@ async def recognize_banana(file: UploadFile = File(...)):
     Utilise le modèle fine-tuné 'banana_model_v1.pth'.
     (Deprecated: use /api/ai/recognize-food instead)
     """
-    contents = await file.read()
-    result = food_service.predict(contents)
+    contents = await read_upload(file)
+    result = await run_inference("predict", contents)
     # Convert to old format for backward compatibility
     return {
         "is_banana": result.get("is_recognized", False),
         "confidence": result.get("confidence", 0),
-        "class_name": result.get("class_name", "unknown")
+        "class_name": result.get("class_name", "unknown"),
+        "model_version": result.get("model_version")
     }
 
 
@@ -83,37 +133,184 @@ async def recognize_food(file: UploadFile = File(...)):
     Reçoit une image et détecte l'aliment.
     Retourne les informations nutritionnelles si l'aliment est reconnu.
     """
-    contents = await file.read()
-    result = food_service.predict(contents)
+    contents = await read_upload(file)
+    result = await run_inference("predict", contents)
     return result
 
 
+@app.post("/api/ai/recognize-food/batch")
+async def recognize_food_batch(files: List[UploadFile] = File(...)):
+    """
+    Reconnaît plusieurs images (plusieurs fichiers ou une archive .zip) en une
+    seule inférence groupée. Les résultats sont renvoyés dans l'ordre d'envoi,
+    avec une erreur par image le cas échéant.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Maximum {BATCH_MAX_FILES} images par requête",
+        )
+
+    images = []
+    total_bytes = 0
+    for file in files:
+        max_bytes = BATCH_MAX_PAYLOAD_BYTES - total_bytes
+        if not is_archive(file):
+            # Chaque image est limitée comme sur /api/ai/recognize-food
+            max_bytes = min(max_bytes, UPLOAD_MAX_BYTES)
+        contents = await read_upload(file, max_bytes)
+        total_bytes += len(contents)
+        if is_archive(file):
+            images.extend(extract_archive(
+                contents, BATCH_MAX_FILES - len(images), max_file_bytes=UPLOAD_MAX_BYTES
+            ))
+        else:
+            images.append((file.filename, contents))
+
+    if len(images) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Maximum {BATCH_MAX_FILES} images par requête",
+        )
+
+    results = await run_inference("predict_many", [data for _, data in images])
+    return {
+        "count": len(results),
+        "results": [
+            {"index": i, "filename": filename, **result}
+            for i, ((filename, _), result) in enumerate(zip(images, results))
+        ],
+    }
+
+
+@app.post("/api/ai/recognize-food/similar")
+async def recognize_food_similar(file: UploadFile = File(...), k: int = 5):
+    """
+    Reconnaissance par similarité d'embeddings : renvoie les k aliments de
+    référence les plus proches, y compris ceux ajoutés sans réentraînement.
+    """
+    contents = await read_upload(file)
+    return await run_inference("recognize_similar", contents, max(1, min(k, 50)))
+
+
+@app.post("/api/ai/recognize-food/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_recognition_job(file: UploadFile = File(...)):
+    """
+    Variante asynchrone de /api/ai/recognize-food : renvoie immédiatement un
+    identifiant de job, le résultat s'obtient ensuite par polling.
+    """
+    contents = await read_upload(file)
+    try:
+        job = recognition_jobs.submit(call_food_service, "predict", contents)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="File de reconnaissance pleine, réessayez plus tard",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return {**job.to_dict(), "poll_url": f"/api/ai/recognize-food/jobs/{job.id}"}
+
+
+@app.get("/api/ai/recognize-food/jobs/{job_id}")
+async def get_recognition_job(job_id: str, wait: float = 0):
+    """
+    État d'un job de reconnaissance, avec le résultat une fois terminé.
+    `wait` (secondes, max ML_JOB_MAX_WAIT_SECONDS) attend la fin du job (long-poll).
+    """
+    job = recognition_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inconnu ou expiré")
+    job = await recognition_jobs.wait(job, max(0.0, min(wait, JOB_MAX_WAIT_SECONDS)))
+    return job.to_dict()
+
+
+@app.post("/api/admin/foods/embeddings", dependencies=[Depends(require_admin)])
+async def add_food_embeddings(
+    food_name: str = Form(...),
+    food_id: Optional[int] = Form(None),
+    files: List[UploadFile] = File(...),
+):
+    """Ajoute des images de référence pour un aliment dans l'index d'embeddings"""
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Maximum {BATCH_MAX_FILES} images par requête",
+        )
+    images = [await read_upload(file) for file in files]
+    return await run_inference("add_reference_images", images, food_name, food_id)
+
+
+@app.get("/api/admin/model", dependencies=[Depends(require_admin)])
+def get_model_status():
+    """Version du modèle servie par ce worker, chargement en cours, caches"""
+    if ml_loader.is_loading():
+        return {**ml_loader.state(), "jobs": recognition_jobs.stats()}
+    return {**get_food_service().status(), "jobs": recognition_jobs.stats()}
+
+
+@app.post("/api/admin/model/reload", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def reload_model(version: Optional[str] = None):
+    """
+    Active une version du registre (ou recharge la version CURRENT) puis la
+    charge en arrière-plan. Les autres workers la détectent par polling.
+    """
+    if version:
+        try:
+            model_registry.activate(version)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    get_food_service().reload_async(version)
+    return {"status": "loading", "requested_version": version or model_registry.current_version()}
+
+
 @app.get("/api/foods/search")
-def search_foods(query: str = "", db: Session = Depends(get_db)):
-    """Recherche dans la base de données"""
-    # if not query:
-    #     return []
-        
-    results = crud.get_foods(db, query)
-    
-    # Convertir en dict pour la réponse (si nécessaire, ou laisser FastAPI le faire via ORM)
-    # On retourne directement les objets ORM, FastAPI gérera la sérialisation si on avait des schemas
-    # Mais ici on retourne une liste brute, donc on va convertir manuellement pour être sûr
-    
-    res_list = []
-    for food in results:
-        res_list.append({
-            "name": food.name,
-            "grams": food.grams,
-            "category": food.category,
-            "calories": food.calories,
-            "protein": food.protein,
-            "carbs": food.carbs,
-            "fat": food.fat
-        })
-        
-    print(f"🔍 Search '{query}' -> {len(res_list)} results.")
-    return res_list
+def search_foods(
+    request: Request,
+    query: str = "",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Recherche d'aliments classée par pertinence, servie depuis le catalogue en
+    mémoire. L'ETag change avec le catalogue : le client revalide avec
+    If-None-Match et reçoit 304 tant que rien n'a changé. Page suivante :
+    repasser l'en-tête X-Next-Cursor dans `cursor`.
+    """
+    limit = max(1, min(limit, 100))
+    after = food_search.FIRST_KEY
+    if cursor:
+        after = decode_cursor(cursor, 4)
+        if not all(isinstance(value, (int, float)) for value in after):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+    catalogue = food_search.catalogue_snapshot(db)
+    if catalogue is None:
+        # Catalogue trop grand pour la mémoire : index trigramme Postgres
+        page = [
+            (key, {
+                "name": food.name,
+                "grams": food.grams,
+                "category": food.category,
+                "calories": food.calories,
+                "protein": food.protein,
+                "carbs": food.carbs,
+                "fat": food.fat
+            })
+            for key, food in food_search.search_foods(db, query, limit, after)
+        ]
+        headers = {}
+    else:
+        headers = {"ETag": catalogue.etag, "Cache-Control": f"public, max-age={FOOD_SEARCH_MAX_AGE}"}
+        if request.headers.get("if-none-match") == catalogue.etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        page = [(key, catalogue.to_dict(row)) for key, row in catalogue.search(normalize_name(query), limit, after)]
+
+    response = page_response(
+        [food for _, food in page], next_cursor(page, limit, lambda entry: encode_cursor(*entry[0]))
+    )
+    response.headers.update(headers)
+    return response
 
 
 # =========================
@@ -125,6 +322,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lisibles par le client web : pagination et revalidation
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# Bornage de la taille des uploads avant le parsing multipart
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={"/api/ai/recognize-food/batch": BATCH_MAX_PAYLOAD_BYTES},
 )
 
 # =========================
@@ -147,6 +352,18 @@ def health_check():
     return {"status": "healthy", "database": "connected"}
 
 
+@app.get("/ready")
+def readiness(require_model: bool = False):
+    """
+    Prêt dès que l'application est importée ; le modèle de reconnaissance peut
+    encore charger. Avec require_model=true, 503 tant qu'il n'est pas chargé.
+    """
+    ml_state = ml_loader.state()
+    if require_model and not ml_state["loaded"]:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=ml_state)
+    return {"status": "ready", "ml": ml_state}
+
+
 # =========================
 # AUTHENTIFICATION
 # =========================
@@ -247,14 +464,29 @@ def add_meal(
     return crud.create_meal(db=db, meal=meal)
 
 
-@app.get("/api/meals", response_model=List[schemas.MealResponse])
+@app.get("/api/meals", response_class=FastJSONResponse, responses=page_responses(schemas.MealResponse))
 def get_my_meals(
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtenir tous les repas de l'utilisateur"""
-    return crud.get_meals_by_user(db, current_user.id, limit)
+    """
+    Obtenir les repas de l'utilisateur, du plus récent au plus ancien. Page
+    suivante : repasser l'en-tête X-Next-Cursor dans `cursor`.
+    """
+    after = None
+    if cursor:
+        created_at, meal_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(created_at), int(meal_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    limit = page_size(limit)
+    meals = crud.get_meals_page(db, current_user.id, limit, after)
+    return page_response(
+        meals, next_cursor(meals, limit, lambda meal: encode_cursor(meal["created_at"].isoformat(), meal["id"]))
+    )
 
 
 @app.get("/api/meals/date/{date}")
@@ -263,9 +495,8 @@ def get_meals_by_date(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtenir les repas d'une date spécifique"""
-    meals = crud.get_meals_by_date(db, current_user.id, date)
-    stats = crud.get_daily_stats(db, current_user.id, date)
+    """Obtenir les repas d'une date spécifique et leurs totaux (une seule requête)"""
+    meals, stats = crud.get_day(db, current_user.id, date)
 
     return {
         "meals": meals,
@@ -289,14 +520,23 @@ def log_weight(
     return crud.create_weight_log(db=db, weight_log=weight_log)
 
 
-@app.get("/api/weight", response_model=List[schemas.WeightLogResponse])
+@app.get("/api/weight", response_class=FastJSONResponse, responses=page_responses(schemas.WeightLogResponse))
 def get_weight_logs(
     limit: int = 30,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtenir l'historique de poids"""
-    return crud.get_weight_logs(db, current_user.id, limit)
+    """Obtenir l'historique de poids, paginé par curseur (en-tête X-Next-Cursor)"""
+    after = None
+    if cursor:
+        date, log_id = decode_cursor(cursor, 2)
+        if not isinstance(date, str) or not isinstance(log_id, int):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        after = (date, log_id)
+    limit = page_size(limit)
+    logs = crud.get_weight_logs_page(db, current_user.id, limit, after)
+    return page_response(logs, next_cursor(logs, limit, lambda log: encode_cursor(log["date"], log["id"])))
 
 
 # =========================
@@ -370,4 +610,5 @@ if __name__ == "__main__":
     print("📡 Server: http://0.0.0.0:8000")
     print("📚 Docs: http://localhost:8000/docs")
     print("=" * 50)
+    init_db()
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,142 @@
+"""
+Per-worker memory of the API server, with and without shared model weights.
+
+Starts gunicorn (gunicorn_conf.py) once per configuration, waits for the
+workers to come up, then reads /proc/<pid>/smaps_rollup of every worker:
+
+    python measure_worker_memory.py --workers 4
+    python measure_worker_memory.py --workers 4 --output worker_memory.json
+
+  private   ML_PRELOAD=0 ML_MMAP_WEIGHTS=0   every worker loads its own copy
+  preload   ML_PRELOAD=1 ML_MMAP_WEIGHTS=0   preloaded master, weights copied
+  shared    ML_PRELOAD=1 ML_MMAP_WEIGHTS=1   preloaded master + mmap'd weights
+
+RSS counts shared pages in every process, so the relevant figures are PSS
+(shared pages split between the processes mapping them) and private memory.
+Linux only.
+
+Three runs with 4 workers, MobileNetV2 (9 MB of weights), torch 2.x on CPU,
+random weights, totals including the master:
+
+  private   PSS 628-659 MB/worker, private 546-578 MB/worker, total 2528-2654 MB
+  preload   PSS 149-182 MB/worker, private  62-94 MB/worker,  total 1001-1129 MB
+  shared    PSS 164-299 MB/worker, private  76-211 MB/worker, total 1056-1598 MB
+
+The saving comes from preloading: the imported torch runtime and model are
+shared copy-on-write, total PSS drops about 2.4x. Memory-mapping a 9 MB
+checkpoint adds nothing measurable (within run-to-run noise); it only pays
+off for much larger weights.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+CONFIGURATIONS = {
+    "private": {"ML_PRELOAD": "0", "ML_MMAP_WEIGHTS": "0"},
+    "preload": {"ML_PRELOAD": "1", "ML_MMAP_WEIGHTS": "0"},
+    "shared": {"ML_PRELOAD": "1", "ML_MMAP_WEIGHTS": "1"},
+}
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, the parent pid follows its closing ")"
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    found.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return sorted(found)
+
+
+def memory_mb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in FIELDS:
+                values[key] = int(rest.split()[0]) / 1024  # kB -> MB
+    return {key: round(values.get(key, 0.0), 1) for key in FIELDS}
+
+
+def wait_ready(url, expected_workers, master_pid, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                if len(children(master_pid)) >= expected_workers:
+                    return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def measure(name, workers, port, settle, timeout):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}", **CONFIGURATIONS[name])
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_ready(f"http://127.0.0.1:{port}/ready?require_model=true", workers, server.pid, timeout):
+            raise RuntimeError(f"{name}: server did not come up within {timeout}s")
+        # Let workers finish warming up before sampling
+        time.sleep(settle)
+        master = memory_mb(server.pid)
+        per_worker = [memory_mb(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    summary = {key: round(sum(w[key] for w in per_worker) / len(per_worker), 1) for key in FIELDS}
+    total_pss = round(master["Pss"] + sum(w["Pss"] for w in per_worker), 1)
+    return {"master": master, "workers": per_worker, "worker_mean": summary, "total_pss_mb": total_pss}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-worker memory with and without shared weights")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds to wait after startup")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("ERROR: /proc/<pid>/smaps_rollup is required (Linux 4.14+)")
+        return 1
+
+    results = {}
+    for name in CONFIGURATIONS:
+        results[name] = measure(name, args.workers, args.port, args.settle, args.timeout)
+        mean = results[name]["worker_mean"]
+        print(
+            f"{name:8s} per worker: RSS {mean['Rss']:.1f} MB, PSS {mean['Pss']:.1f} MB, "
+            f"private {mean['Private_Clean'] + mean['Private_Dirty']:.1f} MB | "
+            f"total PSS {results[name]['total_pss_mb']:.1f} MB"
+        )
+
+    for name in ("preload", "shared"):
+        saved = results["private"]["total_pss_mb"] - results[name]["total_pss_mb"]
+        print(f"{name} saves {saved:.1f} MB of PSS across {args.workers} workers")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"workers": args.workers, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
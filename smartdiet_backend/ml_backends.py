@@ -0,0 +1,416 @@
+"""
+Inference backends for the food recognition model.
+
+The same `banana_model_v1.pth` state dict can be served as:
+  - eager         plain PyTorch (reference)
+  - torchscript   traced + frozen TorchScript graph
+  - onnx          ONNX Runtime, CPU execution provider (requirements-onnx.txt)
+  - int8_static   statically quantized (fused, calibrated) TorchScript graph
+
+The exported artifacts are produced with:
+    python ml_backends.py export --backend onnx
+and checked against the eager model with:
+    python ml_backends.py parity --backend onnx --images dataset
+
+The cascade's first stage is the same backend run at a lower resolution;
+how often it agrees with the full-resolution pass, and which confidence
+threshold keeps that agreement high enough, is measured with:
+    python ml_backends.py cascade --backend int8_static --images dataset
+"""
+import argparse
+import ast
+import glob
+import os
+import sys
+import time
+
+import torch
+from torchvision import models
+
+from ml_preprocess import INPUT_SIZE, decode_image, downscale, preprocess_batch, to_array
+
+# Selected through configuration, falls back to eager if artifacts are missing
+INFERENCE_BACKEND = os.getenv("ML_BACKEND", "eager")
+EXPORT_DIR = os.getenv("ML_EXPORT_DIR", "exported")
+# 0 keeps the torch / onnxruntime defaults
+TORCH_THREADS = int(os.getenv("ML_TORCH_THREADS", "0"))
+# CPU weights stay memory-mapped from the .pth, so every worker process shares
+# the same page-cache pages instead of holding a private copy
+MMAP_WEIGHTS = os.getenv("ML_MMAP_WEIGHTS", "1") == "1"
+
+# Cascade first stage: input resolution, and the confidence (in %) at that
+# resolution above which its top-1 is served without the full-resolution pass
+CASCADE_RESOLUTION = int(os.getenv("ML_CASCADE_RESOLUTION", "128"))
+CASCADE_THRESHOLD = float(os.getenv("ML_CASCADE_THRESHOLD", "90"))
+
+BACKENDS = ("eager", "torchscript", "onnx", "int8_static")
+# Former backends still accepted in ML_BACKEND -> their replacement. int8_dynamic
+# only quantized MobileNetV2's Linear classifier: same size and latency as eager
+LEGACY_BACKENDS = {"int8_dynamic": "int8_static"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+if TORCH_THREADS > 0:
+    torch.set_num_threads(TORCH_THREADS)
+
+
+def load_class_mapping(path):
+    """Reads the `{class_name: index}` mapping written by train_model.py."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return ast.literal_eval(f.read())
+
+
+def build_model(num_classes, quantizable=False):
+    """MobileNetV2 with our classifier head, without pretrained weights."""
+    if quantizable:
+        from torchvision.models.quantization import mobilenet_v2 as quantizable_mobilenet_v2
+        model = quantizable_mobilenet_v2(weights=None, quantize=False)
+    else:
+        model = models.mobilenet_v2(weights=None)
+    model.classifier[1] = torch.nn.Linear(model.last_channel, num_classes)
+    return model
+
+
+def load_state_dict(model_path, device):
+    if MMAP_WEIGHTS and device.type == "cpu":
+        try:
+            return torch.load(model_path, map_location=device, mmap=True, weights_only=True), True
+        except (TypeError, RuntimeError) as e:
+            # torch < 2.1, or a .pth written with the legacy (non-zip) format
+            print(f"Memory-mapped load of {model_path} unavailable ({e}), loading a private copy")
+    return torch.load(model_path, map_location=device), False
+
+
+def load_eager_model(model_path, num_classes, device, quantizable=False):
+    model = build_model(num_classes, quantizable=quantizable)
+    state_dict, mapped = load_state_dict(model_path, device)
+    # assign=True makes the parameters the mapped tensors instead of copying into them
+    model.load_state_dict(state_dict, assign=mapped)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def export_path(model_path, backend, export_dir=EXPORT_DIR):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    extension = ".onnx" if backend == "onnx" else ".pt"
+    return os.path.join(export_dir, f"{stem}.{backend}{extension}")
+
+
+# =========================
+# Backends
+# =========================
+class EagerBackend:
+    name = "eager"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            return self.model(batch)
+
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, path, name=None):
+        self.device = torch.device("cpu")
+        module = torch.jit.load(path, map_location=self.device)
+        module.eval()
+        try:
+            module = torch.jit.optimize_for_inference(module)
+        except Exception as e:
+            print(f"TorchScript optimize_for_inference skipped: {e}")
+        self.module = module
+        if name:
+            self.name = name
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            return self.module(batch)
+
+
+def _import_onnxruntime():
+    # Optional dependency (requirements-onnx.txt), only the onnx backend needs it
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError(
+            "ML_BACKEND=onnx requires onnxruntime: pip install -r requirements-onnx.txt, "
+            "or choose another backend"
+        ) from None
+    return onnxruntime
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path):
+        ort = _import_onnxruntime()
+
+        self.device = torch.device("cpu")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if TORCH_THREADS > 0:
+            options.intra_op_num_threads = TORCH_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.contiguous().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def load_backend(name, model_path, num_classes, device, export_dir=EXPORT_DIR):
+    """
+    Builds the requested backend for `model_path`. Exported artifacts that are
+    missing or older than the .pth are ignored and the eager model is served.
+    Raises RuntimeError for onnx when onnxruntime is not installed.
+    """
+    if name in LEGACY_BACKENDS:
+        print(f"ML_BACKEND '{name}' was removed, using {LEGACY_BACKENDS[name]}")
+        name = LEGACY_BACKENDS[name]
+    if name not in BACKENDS:
+        print(f"Unknown ML_BACKEND '{name}', using eager")
+        name = "eager"
+
+    if name == "onnx":
+        # A missing runtime is a configuration error, not something to hide behind eager
+        _import_onnxruntime()
+
+    if name in ("torchscript", "onnx", "int8_static"):
+        path = export_path(model_path, name, export_dir)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+            print(f"Warning: {path} missing or stale, run 'python ml_backends.py export --backend {name}'. Using eager.")
+            name = "eager"
+        else:
+            try:
+                if name == "onnx":
+                    return OnnxBackend(path)
+                return TorchScriptBackend(path, name=name)
+            except Exception as e:
+                print(f"Error loading {name} backend: {e}. Using eager.")
+                name = "eager"
+
+    return EagerBackend(load_eager_model(model_path, num_classes, device), device)
+
+
+# =========================
+# Export & parity check
+# =========================
+def list_images(images_dir, limit):
+    paths = []
+    for extension in IMAGE_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(images_dir, "**", f"*{extension}"), recursive=True))
+    return sorted(paths)[:limit]
+
+
+def sample_batches(images_dir, limit, batch_size=16):
+    """Preprocessed batches from a local image folder, or random inputs if none."""
+    paths = list_images(images_dir, limit) if images_dir and os.path.isdir(images_dir) else []
+    if not paths:
+        print(f"No images found in {images_dir}, using {limit} random inputs")
+        generator = torch.Generator().manual_seed(0)
+        for start in range(0, limit, batch_size):
+            yield torch.randn(min(batch_size, limit - start), 3, INPUT_SIZE, INPUT_SIZE, generator=generator)
+        return
+
+    for start in range(0, len(paths), batch_size):
+        arrays = []
+        for path in paths[start:start + batch_size]:
+            with open(path, "rb") as f:
+                arrays.append(to_array(decode_image(f.read())))
+        yield preprocess_batch(arrays)
+
+
+def export(backend, model_path, num_classes, calibration_dir, calibration_samples, export_dir=EXPORT_DIR):
+    os.makedirs(export_dir, exist_ok=True)
+    path = export_path(model_path, backend, export_dir)
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+
+    if backend == "torchscript":
+        model = load_eager_model(model_path, num_classes, torch.device("cpu"))
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        torch.jit.save(traced, path)
+
+    elif backend == "onnx":
+        model = load_eager_model(model_path, num_classes, torch.device("cpu"))
+        torch.onnx.export(
+            model, example, path,
+            input_names=["input"], output_names=["logits"],
+            # Variable image size too, so the cascade's first stage runs on this graph
+            dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+
+    elif backend == "int8_static":
+        engine = "qnnpack" if "qnnpack" in torch.backends.quantized.supported_engines and \
+            "fbgemm" not in torch.backends.quantized.supported_engines else "fbgemm"
+        torch.backends.quantized.engine = engine
+        model = load_eager_model(model_path, num_classes, torch.device("cpu"), quantizable=True)
+        model.fuse_model(is_qat=False)
+        model.qconfig = torch.ao.quantization.get_default_qconfig(engine)
+        torch.ao.quantization.prepare(model, inplace=True)
+        # Calibrate activation ranges on representative images
+        with torch.no_grad():
+            for batch in sample_batches(calibration_dir, calibration_samples):
+                model(batch)
+        torch.ao.quantization.convert(model, inplace=True)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        torch.jit.save(traced, path)
+
+    else:
+        print(f"Backend '{backend}' has nothing to export")
+        return None
+
+    print(f"Exported {backend} model to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return path
+
+
+def parity(backend_name, model_path, num_classes, images_dir, samples, export_dir=EXPORT_DIR):
+    """Compares a backend with the eager fp32 model on the same inputs."""
+    cpu = torch.device("cpu")
+    reference = EagerBackend(load_eager_model(model_path, num_classes, cpu), cpu)
+    candidate = load_backend(backend_name, model_path, num_classes, cpu, export_dir)
+    if candidate.name != backend_name:
+        print(f"Backend '{backend_name}' could not be loaded")
+        return None
+
+    agree, total, max_diff = 0, 0, 0.0
+    reference_time, candidate_time = 0.0, 0.0
+    for batch in sample_batches(images_dir, samples):
+        start = time.perf_counter()
+        expected = torch.softmax(reference(batch), dim=1)
+        reference_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = torch.softmax(candidate(batch).float(), dim=1)
+        candidate_time += time.perf_counter() - start
+
+        agree += (expected.argmax(dim=1) == actual.argmax(dim=1)).sum().item()
+        total += batch.shape[0]
+        max_diff = max(max_diff, (expected - actual).abs().max().item())
+
+    report = {
+        "backend": backend_name,
+        "samples": total,
+        "top1_agreement": round(agree / total, 4) if total else 0.0,
+        "max_prob_diff": round(max_diff, 5),
+        "eager_ms_per_image": round(1000 * reference_time / max(total, 1), 3),
+        "backend_ms_per_image": round(1000 * candidate_time / max(total, 1), 3),
+    }
+    print(report)
+    return report
+
+
+def cascade_parity(backend_name, model_path, num_classes, images_dir, samples,
+                   resolution=CASCADE_RESOLUTION, threshold=CASCADE_THRESHOLD,
+                   min_agreement=0.99, export_dir=EXPORT_DIR):
+    """
+    Compares the cascade's first stage (the backend at `resolution`) with the
+    same backend at INPUT_SIZE. The agreement that matters is the one on the
+    images whose first-stage confidence reaches `threshold`, since only those
+    skip the full pass; `suggested_threshold` is the lowest threshold (in %)
+    keeping it at `min_agreement` or above on these samples.
+    """
+    backend = load_backend(backend_name, model_path, num_classes, torch.device("cpu"), export_dir)
+    if backend.name != backend_name:
+        print(f"Backend '{backend_name}' could not be loaded")
+        return None
+
+    confidences, agreements = [], []
+    first_stage_time, full_time = 0.0, 0.0
+    for batch in sample_batches(images_dir, samples):
+        start = time.perf_counter()
+        full = torch.softmax(backend(batch).float(), dim=1)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        first = torch.softmax(backend(downscale(batch, resolution)).float(), dim=1)
+        first_stage_time += time.perf_counter() - start
+
+        confidence, predicted = first.max(dim=1)
+        confidences.extend((confidence * 100).tolist())
+        agreements.extend((predicted == full.argmax(dim=1)).tolist())
+
+    total = len(confidences)
+    accepted = [agree for confidence, agree in zip(confidences, agreements) if confidence >= threshold]
+
+    # Lowest threshold whose accepted images agree often enough: candidates are
+    # the observed confidences, highest first, so agreement is counted once
+    suggested, kept, agree = None, 0, 0
+    for confidence, agreed in sorted(zip(confidences, agreements), reverse=True):
+        kept += 1
+        agree += agreed
+        if agree / kept >= min_agreement:
+            suggested = confidence
+    if suggested is not None:
+        # Rounded down, an image exactly at the cut-off is accepted
+        suggested = int(suggested * 100) / 100
+
+    report = {
+        "backend": backend_name,
+        "resolution": resolution,
+        "samples": total,
+        "top1_agreement": round(sum(agreements) / total, 4) if total else 0.0,
+        "threshold": threshold,
+        "accepted_rate": round(len(accepted) / total, 4) if total else 0.0,
+        "accepted_top1_agreement": round(sum(accepted) / len(accepted), 4) if accepted else None,
+        "suggested_threshold": suggested,
+        "first_stage_ms_per_image": round(1000 * first_stage_time / max(total, 1), 3),
+        "full_ms_per_image": round(1000 * full_time / max(total, 1), 3),
+    }
+    print(report)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and validate optimized inference backends")
+    parser.add_argument("command", choices=["export", "parity", "cascade"])
+    parser.add_argument("--backend", default="all", help=f"one of {', '.join(BACKENDS)} or 'all'")
+    parser.add_argument("--model", default="banana_model_v1.pth")
+    parser.add_argument("--mapping", default="class_mapping.txt")
+    parser.add_argument("--export-dir", default=EXPORT_DIR,
+                        help="for a registry version use model_registry/<version>/exported")
+    parser.add_argument("--images", default="dataset", help="calibration / parity images")
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--resolution", type=int, default=CASCADE_RESOLUTION, help="cascade first-stage resolution")
+    parser.add_argument("--threshold", type=float, default=CASCADE_THRESHOLD, help="cascade confidence threshold (%%)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        print(f"ERROR: {args.model} not found, train the model first.")
+        return 1
+    mapping = load_class_mapping(args.mapping) or {"banana": 0, "other": 1}
+    num_classes = len(mapping)
+    if args.command == "cascade":
+        backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+    else:
+        backends = [b for b in BACKENDS if b != "eager"] if args.backend == "all" else [args.backend]
+
+    status = 0
+    for backend in backends:
+        if args.command == "cascade":
+            report = cascade_parity(
+                backend, args.model, num_classes, args.images, args.samples,
+                args.resolution, args.threshold, args.min_agreement, args.export_dir,
+            )
+            if report is None or (report["accepted_top1_agreement"] or 0.0) < args.min_agreement:
+                status = 1
+        elif args.command == "export":
+            export(backend, args.model, num_classes, args.images, args.samples, args.export_dir)
+        else:
+            report = parity(backend, args.model, num_classes, args.images, args.samples, args.export_dir)
+            if report is None or report["top1_agreement"] < args.min_agreement:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
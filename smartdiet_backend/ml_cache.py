@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+
+CACHE_MAX_ENTRIES = int(os.getenv("ML_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("ML_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("ML_CACHE_TTL_SECONDS", "3600"))
+
+# Near-duplicate lookup: max differing bits (out of 64) to reuse a prediction,
+# a negative value disables it
+PHASH_THRESHOLD = int(os.getenv("ML_PHASH_THRESHOLD", "4"))
+PHASH_MAX_ENTRIES = int(os.getenv("ML_PHASH_MAX_ENTRIES", "512"))
+
+
+def content_key(data, model_version):
+    """Cache key for an upload: hash of the raw bytes plus the model that saw them."""
+    return f"{model_version}:{hashlib.sha256(data).hexdigest()}"
+
+
+def _approx_size(key, value):
+    # Good enough to enforce a memory budget on small JSON-like results
+    return len(key) + len(json.dumps(value, default=str))
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and an approximate byte budget.
+    Used to answer repeated uploads of the same image without running the model.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        size = _approx_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash of a PIL image as a `hash_size**2`-bit integer. Each bit
+    says whether a pixel is brighter than its right neighbour on a tiny
+    grayscale thumbnail, so re-encoding or small shifts barely change it.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class PerceptualIndex:
+    """
+    Bounded index of recent perceptual hashes and their predictions. A lookup
+    returns the stored value of the closest hash within `threshold` bits, with
+    least recently matched entries evicted first.
+    """
+
+    def __init__(self, max_entries=PHASH_MAX_ENTRIES, threshold=PHASH_THRESHOLD):
+        self.max_entries = max(0, int(max_entries))
+        self.threshold = threshold
+        self._entries = OrderedDict()  # (model_version, hash) -> value
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.threshold >= 0 and self.max_entries > 0
+
+    def lookup(self, image_hash, model_version):
+        if not self.enabled:
+            return None
+        with self._lock:
+            best_key, best_distance = None, self.threshold + 1
+            for key in self._entries:
+                if key[0] != model_version:
+                    continue
+                distance = (key[1] ^ image_hash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        break
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]
+
+    def add(self, image_hash, model_version, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (model_version, image_hash)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,73 @@
+"""
+Lazy access to the food recognition service.
+
+Importing ml_service pulls in torch, torchvision and PIL and loads the model,
+which takes seconds. The API only imports this module, so CRUD routes are
+served as soon as the app is imported; the service is created on first use
+or by a background warm-up started at application startup.
+"""
+import os
+import threading
+import time
+
+# Load the model in a background thread at startup instead of on first request
+BACKGROUND_WARMUP = os.getenv("ML_BACKGROUND_WARMUP", "1") == "1"
+
+_service = None
+_lock = threading.Lock()
+_loading = False
+_load_seconds = None
+_last_error = None
+
+
+def get_food_service():
+    """The process-wide FoodReconService, created (and its model loaded) on first call."""
+    global _service, _loading, _load_seconds, _last_error
+    if _service is None:
+        with _lock:
+            if _service is None:
+                _loading = True
+                start = time.perf_counter()
+                try:
+                    from ml_service import FoodReconService
+                    _service = FoodReconService()
+                    _load_seconds = round(time.perf_counter() - start, 3)
+                    _last_error = None
+                except Exception as e:
+                    _last_error = str(e)
+                    raise
+                finally:
+                    _loading = False
+    return _service
+
+
+def is_loaded():
+    return _service is not None
+
+
+def is_loading():
+    return _loading
+
+
+def start_background_warmup():
+    """Creates the service in a daemon thread; no-op if already loaded or disabled."""
+    if not BACKGROUND_WARMUP or _service is not None or _loading:
+        return
+
+    def run():
+        try:
+            get_food_service()
+        except Exception as e:
+            print(f"Background ML warm-up failed: {e}")
+
+    threading.Thread(target=run, name="ml-warmup", daemon=True).start()
+
+
+def state():
+    return {
+        "loaded": _service is not None,
+        "loading": _loading,
+        "model_version": _service.model_version if _service is not None else None,
+        "load_seconds": _load_seconds,
+        "last_error": _last_error,
+    }
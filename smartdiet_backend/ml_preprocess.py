@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+from PIL import Image
+
+from buffers import BufferReader
+
+INPUT_SIZE = 224
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def decode_image(data, size=INPUT_SIZE):
+    """
+    Decodes uploaded bytes to an RGB PIL image no smaller than `size` on each
+    side. For JPEG, draft mode lets libjpeg decode directly at 1/2, 1/4 or 1/8
+    scale, so a 12 MP photo never gets fully materialized.
+    """
+    image = Image.open(BufferReader(data))
+    image.draft("RGB", (size, size))
+    return image.convert("RGB")
+
+
+def to_array(image, size=INPUT_SIZE):
+    """Resizes to `size`x`size` and returns an HWC uint8 array."""
+    # reducing_gap shrinks large non-JPEG images by box-averaging first
+    resized = image.resize((size, size), Image.BILINEAR, reducing_gap=3.0)
+    return np.asarray(resized, dtype=np.uint8)
+
+
+class BatchNormalizer:
+    """
+    Turns a list of HWC uint8 arrays into a normalized NCHW float32 batch with
+    one vectorized pass, reusing preallocated buffers between calls. The
+    returned tensor is a view on those buffers and is overwritten by the next
+    call, so it must be consumed (or cloned) first.
+    """
+
+    def __init__(self, max_batch_size=16, size=INPUT_SIZE):
+        self.size = size
+        self._scale = (1.0 / (255.0 * torch.tensor(STD))).view(1, 3, 1, 1)
+        self._shift = (-torch.tensor(MEAN) / torch.tensor(STD)).view(1, 3, 1, 1)
+        self._allocate(max_batch_size)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._staging = np.empty((capacity, self.size, self.size, 3), dtype=np.uint8)
+        self._input = torch.empty((capacity, 3, self.size, self.size), dtype=torch.float32)
+
+    def __call__(self, arrays):
+        count = len(arrays)
+        if count > self.capacity:
+            self._allocate(count)
+
+        staging = self._staging[:count]
+        for i, array in enumerate(arrays):
+            staging[i] = array
+
+        batch = self._input[:count]
+        # uint8 NHWC -> float NCHW, then (x / 255 - mean) / std as one fused multiply-add
+        batch.copy_(torch.from_numpy(staging).permute(0, 3, 1, 2))
+        batch.mul_(self._scale).add_(self._shift)
+        return batch
+
+
+def preprocess_batch(arrays, size=INPUT_SIZE):
+    """Normalized batch in freshly allocated memory (safe to keep around)."""
+    return BatchNormalizer(len(arrays), size)(arrays)
+
+
+def downscale(batch, size):
+    """Normalized NCHW batch resized to `size`x`size` (the cascade's first-stage input)."""
+    return torch.nn.functional.interpolate(
+        batch, size=(size, size), mode="bilinear", align_corners=False, antialias=True
+    )
@@ -1,96 +1,566 @@
 import torch
-from torchvision import models, transforms
-from PIL import Image
-import io
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime
+from ml_backends import CASCADE_RESOLUTION, CASCADE_THRESHOLD, INFERENCE_BACKEND, load_backend, load_class_mapping
+from ml_cache import ResultCache, PerceptualIndex, content_key, dhash
+from ml_preprocess import INPUT_SIZE, BatchNormalizer, decode_image, downscale, to_array
+from embedding_index import EMBEDDING_INDEX_PATH, EmbeddingIndex, FeatureExtractor, add_and_save, index_file_signature
+from nutrition_index import NutritionIndex, normalize_name
+import numpy as np
+import model_registry
 import os
-import ast
+import queue
+import threading
+import time
 
-MODEL_PATH = "banana_model_v1.pth"
-CLASS_MAPPING_PATH = "class_mapping.txt"
+# Micro-batching: concurrent predict() calls are grouped into a single forward pass
+BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "5"))
+
+# How often each worker checks the model registry for a new version (0 = never)
+MODEL_POLL_SECONDS = float(os.getenv("ML_MODEL_POLL_SECONDS", "30"))
+
+# Number of candidates returned per prediction
+TOP_K = int(os.getenv("ML_TOP_K", "3"))
+# Below this confidence (in %) the top class is reported as not recognized
+MIN_CONFIDENCE = float(os.getenv("ML_MIN_CONFIDENCE", "0"))
+# Catch-all classes of the training set that are not foods
+NON_FOOD_CLASSES = {"other", "others", "unknown", "autre", "background"}
+
+# Cascade: the served backend first runs at ML_CASCADE_RESOLUTION, the full
+# 224x224 pass only for images whose first-stage confidence (in %) is below
+# ML_CASCADE_THRESHOLD. The weights were trained at 224, so the threshold is a
+# per-model setting: take the `suggested_threshold` of
+# `python ml_backends.py cascade --backend <ML_BACKEND> --images <held-out set>`,
+# which keeps first-stage top-1 equal to the full pass on --min-agreement
+# (default 99%) of the images it accepts. The default 90 is not calibrated.
+CASCADE_ENABLED = os.getenv("ML_CASCADE_ENABLED", "0") == "1"
+
+# Set to 0 when the model is preloaded in a process that forks workers
+# (gunicorn_conf.py); each worker then warms up after the fork
+WARMUP_ON_LOAD = os.getenv("ML_WARMUP_ON_LOAD", "1") == "1"
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent threads and hands them to
+    `run_batch` as one list, either when `max_batch_size` items are waiting
+    or `max_wait_ms` after the first one arrived. `run_batch` must return one
+    result per item, in order; each caller gets its own result via a Future.
+    """
+
+    def __init__(self, run_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        # Started lazily so that a service created before fork() gets its own
+        # worker thread in each child process.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="ml-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed: still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            # Skip callers that gave up while waiting
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Everything needed to serve one model version, swapped as a whole."""
+    version: str
+    backend: object
+    idx_to_class: dict
+    source: str
+    loaded_at: str
+    first_stage: object = None  # the backend again, run at CASCADE_RESOLUTION by the cascade
+
+
+class CascadeStats:
+    """Escalation rate and estimated time saved by the cascade."""
 
-class FoodReconService:
     def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+        self.first_stage_seconds = 0.0
+        self.full_seconds = 0.0
+
+    def record(self, images, escalated, first_stage_seconds, full_seconds):
+        with self._lock:
+            self.images += images
+            self.escalated += escalated
+            self.first_stage_seconds += first_stage_seconds
+            self.full_seconds += full_seconds
+
+    def stats(self):
+        with self._lock:
+            full_per_image = self.full_seconds / self.escalated if self.escalated else None
+            saved = None
+            if full_per_image is not None:
+                # Full-model cost avoided for confident images, minus what stage 1 cost for all
+                saved = (self.images - self.escalated) * full_per_image - self.first_stage_seconds
+            return {
+                "enabled": CASCADE_ENABLED,
+                "resolution": CASCADE_RESOLUTION,
+                "threshold": CASCADE_THRESHOLD,
+                "images": self.images,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.images, 4) if self.images else None,
+                "first_stage_ms_per_image": round(1000 * self.first_stage_seconds / self.images, 3) if self.images else None,
+                "full_ms_per_image": round(1000 * full_per_image, 3) if full_per_image is not None else None,
+                "estimated_seconds_saved": round(saved, 3) if saved is not None else None,
+            }
+
+
+class FoodReconService:
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = None
-        self.class_mapping = {}
+        # Replaced by a single assignment on reload; readers take a snapshot
+        self.current = None
+        self.result_cache = ResultCache()
+        self.near_duplicates = PerceptualIndex()
+        # Class -> Food row join, so predictions never hit the database
+        self.nutrition = NutritionIndex(on_change=self._clear_caches)
+        self.cascade_stats = CascadeStats()
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait_ms)
+        # Only touched from the batcher thread, so the buffer can be reused
+        self.normalizer = BatchNormalizer(self.batcher.max_batch_size)
+        self.warm_up_on_load = WARMUP_ON_LOAD
+        self.reload_lock = threading.Lock()
+        self.loading_version = None
+        self.last_error = None
+        self._watch_lock = threading.Lock()
+        self._watcher = None
+        self._watched_signature = None
+        # Embedding-similarity recognizer, created on first use
+        self._similarity_lock = threading.Lock()
+        self.extractor = None
+        self.embedding_index = None
+        self.embedding_batcher = None
         self.load_model()
-        
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        ])
-
-    def load_model(self):
-        if not os.path.exists(MODEL_PATH):
-            print(f"Warning: {MODEL_PATH} not found. Prediction will fail until model is trained.")
+
+    @property
+    def model(self):
+        return self.current.backend if self.current else None
+
+    @property
+    def model_version(self):
+        return self.current.version if self.current else None
+
+    def _build(self, artifacts):
+        class_mapping = load_class_mapping(artifacts.class_mapping_path)
+        if class_mapping is not None:
+            # Invert mapping: index -> class name
+            idx_to_class = {v: k for k, v in class_mapping.items()}
+        else:
+            # Default fallback if file missing
+            idx_to_class = {0: "banana", 1: "other"}
+
+        # Eager PyTorch, TorchScript, ONNX Runtime or int8 depending on ML_BACKEND
+        backend = load_backend(
+            INFERENCE_BACKEND, artifacts.model_path, len(idx_to_class), self.device, artifacts.export_dir
+        )
+
+        first_stage = None
+        if CASCADE_ENABLED:
+            # Same backend at a lower resolution: no second copy of the weights.
+            # ONNX graphs exported with a fixed 224 input can't run it
+            try:
+                backend(torch.zeros(1, 3, CASCADE_RESOLUTION, CASCADE_RESOLUTION, device=backend.device))
+                first_stage = backend
+            except Exception as e:
+                print(f"Cascade disabled for {artifacts.version}: {backend.name} backend can't run "
+                      f"at {CASCADE_RESOLUTION}px ({e}), re-export it")
+
+        loaded = LoadedModel(
+            version=artifacts.version,
+            backend=backend,
+            idx_to_class=idx_to_class,
+            source=artifacts.source,
+            loaded_at=datetime.utcnow().isoformat(),
+            first_stage=first_stage,
+        )
+        if self.warm_up_on_load:
+            self._warm_up(loaded)
+        return loaded
+
+    def _warm_up(self, loaded):
+        # So live requests don't pay for lazy allocations / graph optimization
+        with torch.no_grad():
+            for size in sorted({1, self.batcher.max_batch_size}):
+                loaded.backend(torch.zeros(size, 3, INPUT_SIZE, INPUT_SIZE, device=loaded.backend.device))
+                if loaded.first_stage is not None:
+                    loaded.first_stage(
+                        torch.zeros(size, 3, CASCADE_RESOLUTION, CASCADE_RESOLUTION, device=loaded.first_stage.device)
+                    )
+
+    def warm_up(self):
+        """Warms up the current model and every model loaded from now on (after a fork)."""
+        self.warm_up_on_load = True
+        current = self.current
+        if current is not None:
+            self._warm_up(current)
+
+    def load_model(self, version=None):
+        """
+        Loads and warms up a model version (default: the registry's CURRENT
+        one), then swaps it in. Requests already in flight finish on the model
+        they started with. Returns True if a model is being served afterwards.
+        """
+        loaded = self._load(version)
+        # A failed load keeps serving the previous model
+        return loaded is True or (loaded is False and self.current is not None)
+
+    def _load(self, version=None):
+        """True once `version` is served, False if loading it failed, None if there is no model."""
+        with self.reload_lock:
+            try:
+                artifacts = model_registry.resolve(version)
+                if artifacts is None:
+                    print(f"Warning: {model_registry.LEGACY_MODEL_PATH} not found. Prediction will fail until model is trained.")
+                    return None
+                if self.current is not None and artifacts.version == self.current.version:
+                    return True
+
+                self.loading_version = artifacts.version
+                loaded = self._build(artifacts)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error loading model: {e}")
+                return False
+            finally:
+                self.loading_version = None
+
+            # Nutrition is (re)joined at model load, then refreshed when foods change
+            self.nutrition.refresh()
+            self.current = loaded
+            self.last_error = None
+            # Results computed by a previous model must never be served again
+            self._clear_caches()
+            print(f"Food recognition model {loaded.version} loaded successfully! (backend: {loaded.backend.name})")
+            return True
+
+    def _clear_caches(self):
+        self.result_cache.clear()
+        self.near_duplicates.clear()
+
+    def reload_async(self, version=None):
+        """Loads a model version in the background; traffic keeps using the current one."""
+        thread = threading.Thread(target=self.load_model, args=(version,), name="ml-model-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def _ensure_watcher(self):
+        # Each worker process polls the registry itself, so a new CURRENT
+        # version reaches every uvicorn worker, not just the one that was called.
+        if MODEL_POLL_SECONDS <= 0 or (self._watcher is not None and self._watcher.is_alive()):
             return
+        with self._watch_lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watched_signature = model_registry.signature()
+                self._watcher = threading.Thread(target=self._watch, name="ml-model-watcher", daemon=True)
+                self._watcher.start()
 
-        try:
-            # Recreate the model structure
-            self.model = models.mobilenet_v2(weights=None) # No need for weights, we load ours
-            self.model.classifier[1] = torch.nn.Linear(self.model.last_channel, 2)
-            
-            # Load weights
-            self.model.load_state_dict(torch.load(MODEL_PATH, map_location=self.device))
-            self.model.to(self.device)
-            self.model.eval()
-            print("Food recognition model loaded successfully!")
-            
-            # Load class mapping
-            if os.path.exists(CLASS_MAPPING_PATH):
-                with open(CLASS_MAPPING_PATH, "r") as f:
-                    content = f.read()
-                    self.class_mapping = ast.literal_eval(content)
-                    # Invert mapping: index -> class name
-                    self.idx_to_class = {v: k for k, v in self.class_mapping.items()}
-            else:
-                # Default fallback if file missing
-                self.idx_to_class = {0: "banana", 1: "other"} 
-
-        except Exception as e:
-            print(f"Error loading model: {e}")
+    def _watch(self):
+        while True:
+            time.sleep(MODEL_POLL_SECONDS)
+            try:
+                self._check_registry()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+
+    def _check_registry(self):
+        signature = model_registry.signature()
+        if signature == self._watched_signature:
+            return
+        if self._load() is False:
+            # Not recorded: a half-copied file or a bad checkpoint is retried on the next poll
+            print(f"Model watcher: new model not loaded ({self.last_error}), "
+                  f"still serving {self.model_version}, retrying in {MODEL_POLL_SECONDS:g}s")
+            return
+        self._watched_signature = signature
+
+    def status(self):
+        current = self.current
+        return {
+            "version": current.version if current else None,
+            "source": current.source if current else None,
+            "backend": current.backend.name if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "classes": sorted(current.idx_to_class.values()) if current else [],
+            "loading_version": self.loading_version,
+            "last_error": self.last_error,
+            "registry_current": model_registry.current_version(),
+            "available_versions": model_registry.list_versions(),
+            "result_cache": self.result_cache.stats(),
+            "near_duplicates": self.near_duplicates.stats(),
+            "nutrition_index": self.nutrition.stats(),
+            "cascade": self.cascade_stats.stats(),
+        }
 
     def predict(self, image_bytes):
-        if self.model is None:
+        return self.predict_many([image_bytes])[0]
+
+    def predict_many(self, images):
+        """
+        Predicts a list of uploaded images, returning one result per image in
+        the same order. Images that miss both caches are submitted to the
+        batcher together so they share forward passes; a failing image only
+        produces an {"error": ...} entry for itself.
+        """
+        if self.current is None:
             # Try reloading in case it was just trained
             self.load_model()
-            if self.model is None:
-                return {"error": "Model not trained yet"}
+            if self.current is None:
+                return [{"error": "Model not trained yet"} for _ in images]
+        self._ensure_watcher()
+        self.nutrition.poller.maybe_check_async()
+
+        # Snapshot: the whole call is served by one model version
+        current = self.current
+        model_version = current.version
+        results = [None] * len(images)
+        to_infer = []  # (index, cache_key, image_hash, array)
+
+        for i, image_bytes in enumerate(images):
+            cache_key = content_key(image_bytes, model_version)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                results[i] = dict(cached)
+                continue
+
+            try:
+                image = decode_image(image_bytes)
+
+                # Same plate photographed twice / re-encoded by the phone
+                image_hash = dhash(image) if self.near_duplicates.enabled else None
+                if image_hash is not None:
+                    result = self.near_duplicates.lookup(image_hash, model_version)
+                    if result is not None:
+                        self.result_cache.put(cache_key, result)
+                        results[i] = dict(result)
+                        continue
+
+                to_infer.append((i, cache_key, image_hash, to_array(image)))
+            except Exception as e:
+                results[i] = {"error": str(e)}
+
+        # Submit everything at once so the images end up in the same batches
+        futures = [self.batcher.submit((current, array)) for _, _, _, array in to_infer]
+
+        for (i, cache_key, image_hash, _), future in zip(to_infer, futures):
+            try:
+                # Blocks until the batch containing this image has been processed
+                result = future.result()
+            except Exception as e:
+                results[i] = {"error": str(e)}
+                continue
+
+            self.result_cache.put(cache_key, result)
+            if image_hash is not None:
+                self.near_duplicates.add(image_hash, model_version, result)
+            results[i] = dict(result)
+
+        return results
 
+    # =========================
+    # Embedding-similarity recognition
+    # =========================
+    def _ensure_similarity(self):
+        if self.embedding_batcher is not None:
+            return
+        with self._similarity_lock:
+            if self.embedding_batcher is None:
+                self.extractor = FeatureExtractor(self.device)
+                self.embedding_index = EmbeddingIndex.load(EMBEDDING_INDEX_PATH, self.extractor.dim)
+                embedding_normalizer = BatchNormalizer(self.batcher.max_batch_size)
+                self.embedding_batcher = MicroBatcher(
+                    lambda arrays: list(self.extractor(embedding_normalizer(arrays))),
+                    self.batcher.max_batch_size,
+                    self.batcher.max_wait * 1000,
+                )
+
+    def _refresh_embedding_index(self):
+        # References added through another worker are picked up from disk
+        signature = index_file_signature(EMBEDDING_INDEX_PATH)
+        if signature != self.embedding_index.file_signature:
+            with self._similarity_lock:
+                if signature != self.embedding_index.file_signature:
+                    self.embedding_index = EmbeddingIndex.load(EMBEDDING_INDEX_PATH, self.extractor.dim)
+
+    def embed_many(self, images):
+        """One normalized embedding per image, or an {"error": ...} dict."""
+        self._ensure_similarity()
+        results = [None] * len(images)
+        pending = []
+        for i, image_bytes in enumerate(images):
+            try:
+                pending.append((i, self.embedding_batcher.submit(to_array(decode_image(image_bytes)))))
+            except Exception as e:
+                results[i] = {"error": str(e)}
+        for i, future in pending:
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {"error": str(e)}
+        return results
+
+    def recognize_similar(self, image_bytes, k=5):
+        """Top-k closest reference foods for an upload."""
         try:
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            tensor = self.transform(image).unsqueeze(0).to(self.device)
+            self._ensure_similarity()
+        except FileNotFoundError as e:
+            return {"error": str(e)}
+        embedding = self.embed_many([image_bytes])[0]
+        if isinstance(embedding, dict):
+            return embedding
+        self._refresh_embedding_index()
+        index = self.embedding_index
+        return {
+            "candidates": index.search(embedding, k),
+            "index_size": len(index),
+        }
 
-            with torch.no_grad():
-                outputs = self.model(tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
-                
-                class_idx = predicted.item()
-                class_name = self.idx_to_class.get(class_idx, "unknown")
-                prob = confidence.item()
-
-                is_banana = "banana" in class_name.lower()
-                
-                # Nutritional information for banana (per 100g)
-                nutritional_info = None
-                if is_banana:
-                    nutritional_info = {
-                        "calories": 89,
-                        "protein": 1.1,
-                        "carbs": 22.8,
-                        "fat": 0.3
-                    }
-                
-                return {
-                    "is_recognized": is_banana,
-                    "food_name": "Banane" if is_banana else "Inconnu",
-                    "confidence": round(prob * 100, 2),
-                    "class_name": class_name,
-                    "nutritional_info": nutritional_info
-                }
-        except Exception as e:
+    def add_reference_images(self, images, food_name, food_id=None):
+        """Inserts reference embeddings for a food, persisted for the other workers."""
+        try:
+            self._ensure_similarity()
+        except FileNotFoundError as e:
             return {"error": str(e)}
+        embeddings = self.embed_many(images)
+        vectors = [e for e in embeddings if not isinstance(e, dict)]
+        errors = [{"index": i, **e} for i, e in enumerate(embeddings) if isinstance(e, dict)]
+        if vectors:
+            # The file lock serializes writers across workers, the reload inside
+            # add_and_save keeps what other workers added in the meantime
+            with self._similarity_lock:
+                self.embedding_index = add_and_save(
+                    self.embedding_index, EMBEDDING_INDEX_PATH, np.stack(vectors), food_name, food_id
+                )
+        return {"added": len(vectors), "errors": errors, "index": self.embedding_index.stats()}
+
+    def _run_batch(self, items):
+        """
+        Runs the forward pass over a list of (LoadedModel, 224x224x3 uint8
+        array). Items are grouped per model so a batch collected during a
+        hot swap is still answered by the version each request started with.
+        """
+        groups = {}
+        for position, (loaded, _) in enumerate(items):
+            groups.setdefault(id(loaded), (loaded, []))[1].append(position)
+
+        results = [None] * len(items)
+        for loaded, positions in groups.values():
+            batch = self.normalizer([items[p][1] for p in positions]).to(loaded.backend.device)
+
+            with torch.no_grad():
+                if loaded.first_stage is not None:
+                    probabilities, stages = self._run_cascade(loaded, batch)
+                else:
+                    probabilities, stages = self._forward(loaded.backend, batch), [None] * len(positions)
+                confidences, predicted = torch.topk(probabilities, min(TOP_K, probabilities.shape[1]), dim=1)
+
+            for position, class_indices, probs, stage in zip(positions, predicted.tolist(), confidences.tolist(), stages):
+                results[position] = self._format_prediction(loaded, list(zip(class_indices, probs)), stage)
+        return results
+
+    @staticmethod
+    def _forward(backend, batch):
+        return torch.nn.functional.softmax(backend(batch).float(), dim=1)
+
+    def _run_cascade(self, loaded, batch):
+        """Low-resolution first pass; only unconfident images go through the full model."""
+        start = time.perf_counter()
+        probabilities = self._forward(loaded.first_stage, downscale(batch, CASCADE_RESOLUTION))
+        first_stage_seconds = time.perf_counter() - start
+
+        escalate = (probabilities.max(dim=1).values * 100 < CASCADE_THRESHOLD).nonzero().flatten()
+        full_seconds = 0.0
+        if len(escalate):
+            start = time.perf_counter()
+            probabilities[escalate] = self._forward(loaded.backend, batch[escalate])
+            full_seconds = time.perf_counter() - start
+
+        self.cascade_stats.record(batch.shape[0], len(escalate), first_stage_seconds, full_seconds)
+        stages = [1] * batch.shape[0]
+        for i in escalate.tolist():
+            stages[i] = 2
+        return probabilities, stages
+
+    def _format_prediction(self, loaded, top, cascade_stage=None):
+        """Top-k (class index, probability) pairs -> response joined with nutrition per 100g."""
+        candidates = []
+        for class_idx, prob in top:
+            class_name = loaded.idx_to_class.get(class_idx, "unknown")
+            food = self.nutrition.lookup(class_name)
+            candidates.append({
+                "class_name": class_name,
+                "food_name": food["name"] if food else class_name,
+                "food_id": food["food_id"] if food else None,
+                "confidence": round(prob * 100, 2),
+                "nutritional_info": food["nutrition"] if food else None,
+                "is_food": normalize_name(class_name) not in NON_FOOD_CLASSES,
+            })
+
+        best = candidates[0]
+        is_recognized = best["is_food"] and best["confidence"] >= MIN_CONFIDENCE
 
-food_service = FoodReconService()
+        result = {
+            "is_recognized": is_recognized,
+            "food_name": best["food_name"] if is_recognized else "Inconnu",
+            "confidence": best["confidence"],
+            "class_name": best["class_name"],
+            "nutritional_info": best["nutritional_info"] if is_recognized else None,
+            "candidates": [
+                {key: value for key, value in candidate.items() if key != "is_food"}
+                for candidate in candidates if candidate["is_food"]
+            ],
+            "model_version": loaded.version
+        }
+        if cascade_stage is not None:
+            result["cascade_stage"] = cascade_stage
+        return result
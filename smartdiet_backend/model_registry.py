@@ -0,0 +1,184 @@
+"""
+Versioned storage for the food recognition model.
+
+    model_registry/
+        CURRENT                      name of the version to serve
+        20260101-120000-3fa2c1d9e0b4/
+            banana_model_v1.pth
+            class_mapping.txt
+            exported/                optional ml_backends.py exports
+
+Publishing a new version and pointing CURRENT at it is what triggers a hot
+reload in running workers:
+
+    python model_registry.py publish --activate
+    python model_registry.py list
+    python model_registry.py activate <version>
+
+When the registry is empty, the legacy files next to the code
+(banana_model_v1.pth / class_mapping.txt) are served instead.
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+REGISTRY_DIR = os.getenv("ML_MODEL_REGISTRY_DIR", "model_registry")
+LEGACY_MODEL_PATH = "banana_model_v1.pth"
+LEGACY_CLASS_MAPPING_PATH = "class_mapping.txt"
+MODEL_FILENAME = "banana_model_v1.pth"
+CLASS_MAPPING_FILENAME = "class_mapping.txt"
+CURRENT_FILENAME = "CURRENT"
+
+
+@dataclass(frozen=True)
+class ModelArtifacts:
+    version: str
+    model_path: str
+    class_mapping_path: str
+    export_dir: str
+    source: str  # "registry" or "legacy"
+
+
+def artifact_version(*paths):
+    """Short content hash identifying a set of model artifacts."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _pointer_path(registry_dir):
+    return os.path.join(registry_dir, CURRENT_FILENAME)
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    try:
+        with open(_pointer_path(registry_dir)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def signature(registry_dir=REGISTRY_DIR):
+    """Cheap fingerprint that changes whenever the model to serve may have changed."""
+    try:
+        legacy_mtime = os.path.getmtime(LEGACY_MODEL_PATH)
+    except OSError:
+        legacy_mtime = None
+    return current_version(registry_dir), legacy_mtime
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.exists(os.path.join(registry_dir, name, MODEL_FILENAME))
+    )
+
+
+def resolve(version=None, registry_dir=REGISTRY_DIR):
+    """
+    Artifacts for `version`, or for the CURRENT one. Returns None when nothing
+    is available (no registry version and no legacy model file).
+    """
+    version = version or current_version(registry_dir)
+    if version:
+        version_dir = os.path.join(registry_dir, version)
+        model_path = os.path.join(version_dir, MODEL_FILENAME)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model version '{version}' not found in {registry_dir}")
+        return ModelArtifacts(
+            version=version,
+            model_path=model_path,
+            class_mapping_path=os.path.join(version_dir, CLASS_MAPPING_FILENAME),
+            export_dir=os.path.join(version_dir, "exported"),
+            source="registry",
+        )
+
+    if os.path.exists(LEGACY_MODEL_PATH):
+        return ModelArtifacts(
+            version=artifact_version(LEGACY_MODEL_PATH, LEGACY_CLASS_MAPPING_PATH),
+            model_path=LEGACY_MODEL_PATH,
+            class_mapping_path=LEGACY_CLASS_MAPPING_PATH,
+            export_dir=os.getenv("ML_EXPORT_DIR", "exported"),
+            source="legacy",
+        )
+    return None
+
+
+def activate(version, registry_dir=REGISTRY_DIR):
+    """Atomically points CURRENT at `version`."""
+    if version not in list_versions(registry_dir):
+        raise FileNotFoundError(f"Model version '{version}' not found in {registry_dir}")
+    tmp_path = _pointer_path(registry_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, _pointer_path(registry_dir))
+
+
+def publish(model_path=LEGACY_MODEL_PATH, class_mapping_path=LEGACY_CLASS_MAPPING_PATH,
+            version=None, registry_dir=REGISTRY_DIR, make_current=False):
+    """Copies a trained model into a new immutable version directory."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(model_path)
+    if version is None:
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        version = f"{stamp}-{artifact_version(model_path, class_mapping_path)}"
+
+    version_dir = os.path.join(registry_dir, version)
+    if os.path.exists(version_dir):
+        raise FileExistsError(f"Model version '{version}' already exists")
+
+    # Copy into a temporary directory first so readers never see half a version
+    staging_dir = version_dir + ".tmp"
+    os.makedirs(staging_dir, exist_ok=True)
+    shutil.copy2(model_path, os.path.join(staging_dir, MODEL_FILENAME))
+    if os.path.exists(class_mapping_path):
+        shutil.copy2(class_mapping_path, os.path.join(staging_dir, CLASS_MAPPING_FILENAME))
+    os.replace(staging_dir, version_dir)
+
+    if make_current:
+        activate(version, registry_dir)
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned food recognition models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = subparsers.add_parser("publish")
+    publish_parser.add_argument("--model", default=LEGACY_MODEL_PATH)
+    publish_parser.add_argument("--mapping", default=LEGACY_CLASS_MAPPING_PATH)
+    publish_parser.add_argument("--version")
+    publish_parser.add_argument("--activate", action="store_true")
+
+    subparsers.add_parser("list")
+
+    activate_parser = subparsers.add_parser("activate")
+    activate_parser.add_argument("version")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        version = publish(args.model, args.mapping, args.version, make_current=args.activate)
+        print(f"Published model version {version}" + (" (active)" if args.activate else ""))
+    elif args.command == "activate":
+        activate(args.version)
+        print(f"Active model version: {args.version}")
+    else:
+        active = current_version()
+        for version in list_versions():
+            print(("* " if version == active else "  ") + version)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -21,6 +21,7 @@ class User(Base):
     
     meals = relationship("Meal", back_populates="user", cascade="all, delete-orphan")
     weight_logs = relationship("WeightLog", back_populates="user", cascade="all, delete-orphan")
+    daily_totals = relationship("DailyTotal", back_populates="user", cascade="all, delete-orphan")
 
 class Meal(Base):
     __tablename__ = "meals"
@@ -43,6 +44,27 @@ class Meal(Base):
     
     user = relationship("User", back_populates="meals")
 
+    # Keyset pagination of a user's meals on (created_at, id), meals of a day
+    __table_args__ = (
+        Index("ix_meals_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_meals_user_date", "user_id", "date"),
+    )
+
+class DailyTotal(Base):
+    """Totaux d'une journée, mis à jour dans la transaction de chaque repas créé"""
+    __tablename__ = "daily_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    date = Column(String(20), primary_key=True)
+    total_calories = Column(Float, nullable=False, default=0)
+    total_protein = Column(Float, nullable=False, default=0)
+    total_carbs = Column(Float, nullable=False, default=0)
+    total_fat = Column(Float, nullable=False, default=0)
+    meal_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = relationship("User", back_populates="daily_totals")
+
 class WeightLog(Base):
     __tablename__ = "weight_logs"
     
@@ -54,6 +76,9 @@ class WeightLog(Base):
     
     user = relationship("User", back_populates="weight_logs")
 
+    # Keyset pagination of a user's weight logs on (date, id)
+    __table_args__ = (Index("ix_weight_logs_user_date_id", "user_id", "date", "id"),)
+
 class Food(Base):
     __tablename__ = "foods"
     
@@ -67,4 +92,11 @@ class Food(Base):
     fiber = Column(Float)
     grams = Column(Float)
     serving_size = Column(String(50))
-    serving_unit = Column(String(20))
\ No newline at end of file
+    serving_unit = Column(String(20))
+
+class CatalogueVersion(Base):
+    """Compteur incrémenté à chaque écriture sur foods (triggers installés par database.py)"""
+    __tablename__ = "catalogue_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
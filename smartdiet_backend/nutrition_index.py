@@ -0,0 +1,106 @@
+import json
+import os
+import unicodedata
+
+import catalogue
+import models
+
+# Optional {"class_name": "Food.name"} file for classes named differently from the catalogue
+CLASS_FOOD_ALIASES_PATH = os.getenv("ML_CLASS_FOOD_ALIASES_PATH", "class_food_aliases.json")
+
+# Training folders are named in English, the catalogue is in French
+DEFAULT_ALIASES = {
+    "banana": "banane",
+}
+
+# Served when the catalogue has no matching food (values per 100g)
+FALLBACK_FOODS = {
+    "banana": {
+        "name": "Banane",
+        "food_id": None,
+        "nutrition": {"calories": 89, "protein": 1.1, "carbs": 22.8, "fat": 0.3},
+    },
+}
+
+
+def normalize_name(name):
+    """Case- and accent-insensitive key: 'Pâté ' -> 'pate'."""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def _per_100g(value, grams):
+    if value is None:
+        return None
+    if grams:
+        value = value * 100.0 / grams
+    return round(value, 2)
+
+
+class NutritionIndex:
+    """
+    In-memory {class name -> food + nutrition per 100g} built from the Food
+    table, so recognition never queries the database. The whole dict is
+    replaced on refresh, which the catalogue poller triggers only when the
+    catalogue changed; `on_change` is then called (e.g. to drop cached
+    predictions holding the old values).
+    """
+
+    def __init__(self, poller=catalogue.poller, on_change=None):
+        self.poller = poller
+        self.on_change = on_change
+        self.aliases = dict(DEFAULT_ALIASES)
+        if os.path.exists(CLASS_FOOD_ALIASES_PATH):
+            with open(CLASS_FOOD_ALIASES_PATH) as f:
+                self.aliases.update({normalize_name(k): v for k, v in json.load(f).items()})
+        self._foods = {}
+        self.version = 0
+        poller.subscribe(self._rebuild)
+
+    def _rebuild(self, db, signature):
+        rows = db.query(
+            models.Food.id, models.Food.name, models.Food.calories, models.Food.protein,
+            models.Food.carbs, models.Food.fat, models.Food.fiber, models.Food.grams,
+        ).all()
+        foods = {}
+        for food_id, name, calories, protein, carbs, fat, fiber, grams in rows:
+            key = normalize_name(name)
+            # Keep the first (lowest id) food for duplicated names
+            if key in foods:
+                continue
+            foods[key] = {
+                "name": name,
+                "food_id": food_id,
+                "nutrition": {
+                    "calories": _per_100g(calories, grams),
+                    "protein": _per_100g(protein, grams),
+                    "carbs": _per_100g(carbs, grams),
+                    "fat": _per_100g(fat, grams),
+                    "fiber": _per_100g(fiber, grams),
+                },
+            }
+        self._foods = foods
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change()
+
+    def refresh(self, force=False):
+        """Rebuilds the index if the catalogue changed. Returns True if it did."""
+        return self.poller.check(force, only=self._rebuild)
+
+    def lookup(self, class_name):
+        key = normalize_name(class_name)
+        foods = self._foods
+        food = foods.get(key)
+        if food is None and key in self.aliases:
+            food = foods.get(normalize_name(self.aliases[key]))
+        if food is None:
+            food = FALLBACK_FOODS.get(key)
+        return food
+
+    def stats(self):
+        return {
+            "foods": len(self._foods),
+            "version": self.version,
+            "last_error": self.poller.errors.get(self._rebuild),
+        }
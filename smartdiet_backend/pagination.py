@@ -0,0 +1,69 @@
+import base64
+import json
+import os
+from typing import List
+
+from fastapi import HTTPException, status
+
+from responses import FastJSONResponse
+
+# Largest page a list endpoint returns, whatever `limit` asks for
+MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_size(limit):
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(*values):
+    """Opaque cursor for the sort key of the last item of a page."""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """Sort key values of a cursor made by encode_cursor; 400 if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide")
+    return values
+
+
+def next_cursor(items, limit, cursor_of):
+    """Cursor of the page after `items`; None on the last page (a full page means there may be more)."""
+    if items and len(items) == limit:
+        return cursor_of(items[-1])
+    return None
+
+
+def page_response(items, cursor=None):
+    """
+    List response with the next page's cursor in the X-Next-Cursor header, so
+    the body keeps its plain list shape.
+    """
+    headers = {NEXT_CURSOR_HEADER: cursor} if cursor else {}
+    return FastJSONResponse(items, headers=headers)
+
+
+def page_responses(item_schema):
+    """
+    OpenAPI `responses=` for a route returning page_response(): the handlers
+    skip response_model (and its per-item validation) to serialize plain row
+    dicts, the documented body and header come from here instead.
+    """
+    return {
+        200: {
+            "model": List[item_schema],
+            "headers": {
+                NEXT_CURSOR_HEADER: {
+                    "description": "Curseur de la page suivante, absent sur la dernière page",
+                    "schema": {"type": "string"},
+                },
+            },
+        },
+    }
@@ -0,0 +1,66 @@
+"""
+Import-time profile of the API.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+reports the total import time and the slowest top-level packages, so heavy
+imports creeping back into the startup path are easy to spot:
+
+    python profile_imports.py
+    python profile_imports.py --module ml_service --top 20 --output imports.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def profile(module):
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    # Lines look like: "import time:   self [us] |  cumulative | imported package"
+    packages = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000  # us -> ms
+
+    return {
+        "module": module,
+        "wall_seconds": round(wall_seconds, 3),
+        "import_ms": round(sum(packages.values()), 1),
+        "packages_ms": {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of the API")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = profile(args.module)
+    print(f"import {report['module']}: {report['import_ms']:.1f} ms of imports, "
+          f"{report['wall_seconds']:.2f} s wall clock (interpreter start included)")
+    for name, ms in list(report["packages_ms"].items())[:args.top]:
+        print(f"  {ms:9.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for plain dicts/lists (no Pydantic pass), rendered with
+    orjson when installed and with the standard json module otherwise.
+    Datetimes are written in ISO format in both cases.
+    """
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+# Throwaway SQLite database (or TEST_DATABASE_URL, emptied after every test) and no
+# model loading; set before the app modules are imported
+_tmp_dir = tempfile.mkdtemp(prefix="smartdiet-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}")
+os.environ["ML_BACKGROUND_WARMUP"] = "0"
+
+import pytest
+
+from database import Base, SessionLocal, engine, init_db
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db):
+    """API client logged in as a freshly registered user (its id in `client.user_id`)."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        response = test_client.post("/api/register", json={
+            "name": "Test", "email": "test@example.com", "password": "secret123",
+            "age": 30, "weight": 70.0, "height": 175.0, "gender": "femme", "goal": "maintien",
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        test_client.headers["Authorization"] = f"Bearer {body['access_token']}"
+        test_client.user_id = body["user"]["id"]
+        yield test_client
@@ -0,0 +1,65 @@
+import io
+import zipfile
+
+import pytest
+
+import main
+
+LIMIT = 1000
+
+
+@pytest.fixture
+def batch_client(client, monkeypatch):
+    """Client with a tiny per-image limit; inference answers one result per image."""
+    async def fake_inference(method, images):
+        assert method == "predict_many"
+        return [{"size": len(data)} for data in images]
+
+    monkeypatch.setattr(main, "UPLOAD_MAX_BYTES", LIMIT)
+    monkeypatch.setattr(main, "run_inference", fake_inference)
+    return client
+
+
+def zip_of(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def post_batch(client, files):
+    return client.post("/api/ai/recognize-food/batch", files=[("files", f) for f in files])
+
+
+def test_images_within_the_per_image_limit_are_recognized(batch_client):
+    response = post_batch(batch_client, [
+        ("a.jpg", b"a" * LIMIT, "image/jpeg"),
+        ("b.jpg", b"b" * 10, "image/jpeg"),
+    ])
+    assert response.status_code == 200, response.text
+    assert [r["size"] for r in response.json()["results"]] == [LIMIT, 10]
+
+
+def test_oversized_part_is_rejected(batch_client):
+    response = post_batch(batch_client, [
+        ("a.jpg", b"a" * 10, "image/jpeg"),
+        ("big.jpg", b"b" * (LIMIT + 1), "image/jpeg"),
+    ])
+    assert response.status_code == 413
+
+
+def test_oversized_archive_entry_is_rejected(batch_client):
+    # The archive itself is small: the entry compresses well
+    archive = zip_of({"a.jpg": b"a" * 10, "big.jpg": b"b" * (LIMIT + 1)})
+    assert len(archive) < LIMIT
+    response = post_batch(batch_client, [("photos.zip", archive, "application/zip")])
+    assert response.status_code == 413
+    assert "big.jpg" in response.json()["detail"]
+
+
+def test_archive_may_exceed_the_per_image_limit(batch_client):
+    archive = zip_of({f"{i}.jpg": bytes([i]) * LIMIT for i in range(3)})
+    response = post_batch(batch_client, [("photos.zip", archive, "application/zip")])
+    assert response.status_code == 200, response.text
+    assert [r["filename"] for r in response.json()["results"]] == ["0.jpg", "1.jpg", "2.jpg"]
@@ -0,0 +1,81 @@
+import pytest
+import torch
+
+import ml_backends
+import ml_service
+import model_registry
+from ml_preprocess import INPUT_SIZE
+
+CPU = torch.device("cpu")
+
+
+class ResolutionBackend:
+    """Stage 1 is confident for images far from 0, the full pass always answers class 1."""
+
+    name = "fake"
+    device = CPU
+
+    def __init__(self):
+        self.batch_shapes = []
+
+    def __call__(self, batch):
+        self.batch_shapes.append(tuple(batch.shape))
+        if batch.shape[-1] == INPUT_SIZE:
+            return torch.tensor([[0.0, 10.0]] * batch.shape[0])
+        values = batch[:, 0, 0, 0]
+        return torch.stack([values, torch.zeros_like(values)], dim=1)
+
+
+def loaded_model(backend):
+    return ml_service.LoadedModel(
+        version="v1", backend=backend, idx_to_class={0: "banana", 1: "other"},
+        source="test", loaded_at="now", first_stage=backend,
+    )
+
+
+def images(*values):
+    return torch.stack([torch.full((3, INPUT_SIZE, INPUT_SIZE), value) for value in values])
+
+
+def test_only_unconfident_images_are_escalated(monkeypatch):
+    monkeypatch.setattr(ml_service, "CASCADE_THRESHOLD", 90.0)
+    service = ml_service.FoodReconService()
+    backend = ResolutionBackend()
+
+    # softmax([5, 0]) ~ 99% class 0, softmax([0, 0]) = 50%, softmax([-5, 0]) ~ 99% class 1
+    probabilities, stages = service._run_cascade(loaded_model(backend), images(5.0, 0.0, -5.0))
+
+    assert stages == [1, 2, 1]
+    assert probabilities.argmax(dim=1).tolist() == [0, 1, 1]
+    resolution = ml_service.CASCADE_RESOLUTION
+    assert backend.batch_shapes == [(3, 3, resolution, resolution), (1, 3, INPUT_SIZE, INPUT_SIZE)]
+
+    stats = service.cascade_stats.stats()
+    assert stats["images"] == 3
+    assert stats["escalated"] == 1
+    assert stats["escalation_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert stats["full_ms_per_image"] is not None
+
+
+def test_confident_batch_skips_the_full_pass(monkeypatch):
+    monkeypatch.setattr(ml_service, "CASCADE_THRESHOLD", 90.0)
+    service = ml_service.FoodReconService()
+    backend = ResolutionBackend()
+
+    _, stages = service._run_cascade(loaded_model(backend), images(6.0, -6.0))
+
+    assert stages == [1, 1]
+    assert len(backend.batch_shapes) == 1
+    stats = service.cascade_stats.stats()
+    assert stats["escalated"] == 0
+    assert stats["full_ms_per_image"] is None
+
+
+def test_first_stage_reuses_the_served_backend(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ml_service, "WARMUP_ON_LOAD", False)
+    monkeypatch.setattr(ml_service, "CASCADE_ENABLED", True)
+    torch.save(ml_backends.build_model(2).state_dict(), model_registry.LEGACY_MODEL_PATH)
+
+    service = ml_service.FoodReconService()
+    assert service.current.first_stage is service.current.backend
@@ -0,0 +1,47 @@
+import models
+from catalogue import CataloguePoller
+
+
+def add_food(db, name):
+    db.add(models.Food(name=name, calories=50, grams=100))
+    db.commit()
+
+
+def test_one_check_serves_every_subscriber(db):
+    calls = []
+    poller = CataloguePoller(refresh_seconds=0)
+    poller.subscribe(lambda session, signature: calls.append(("search", signature)))
+    poller.subscribe(lambda session, signature: calls.append(("nutrition", signature)))
+
+    add_food(db, "Pomme")
+    assert poller.check()
+    assert [name for name, _ in calls] == ["search", "nutrition"]
+    assert calls[0][1] == calls[1][1]
+
+    assert not poller.check()
+    assert len(calls) == 2
+
+    db.query(models.Food).update({"calories": 60})
+    db.commit()
+    assert poller.check()
+    assert len(calls) == 4
+
+
+def test_failed_rebuild_is_retried(db):
+    attempts = []
+
+    def rebuild(session, signature):
+        attempts.append(signature)
+        if len(attempts) == 1:
+            raise RuntimeError("database gone")
+
+    poller = CataloguePoller(refresh_seconds=0, on_change=rebuild)
+    add_food(db, "Pomme")
+    assert not poller.check()
+    assert poller.errors[rebuild] == "database gone"
+    assert poller.signature(rebuild) is None
+
+    assert poller.check()
+    assert len(attempts) == 2
+    assert rebuild not in poller.errors
+    assert not poller.check()
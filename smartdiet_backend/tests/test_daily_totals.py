@@ -0,0 +1,76 @@
+from sqlalchemy import event
+
+import crud
+import models
+import schemas
+from database import engine
+
+DAY = "2026-10-17"
+
+
+def meal(user_id, calories, date=DAY, **macros):
+    values = {"protein": 10.0, "carbs": 20.0, "fat": 5.0, **macros}
+    return schemas.MealCreate(user_id=user_id, name="Repas", meal_type="déjeuner",
+                              calories=calories, date=date, **values)
+
+
+def aggregate(db, user_id, date):
+    return db.execute(crud._day_aggregate(user_id, date)).one()._asdict()
+
+
+def test_totals_match_aggregate_after_several_meals(client, db):
+    for calories, protein in ((350, 12.5), (620, 30.0), (180, 4.0)):
+        crud.create_meal(db, meal(client.user_id, calories, protein=protein))
+    crud.create_meal(db, meal(client.user_id, 999, date="2026-10-18"))
+
+    expected = aggregate(db, client.user_id, DAY)
+    meals, stats = crud.get_day(db, client.user_id, DAY)
+    assert len(meals) == 3
+    assert stats["meal_count"] == expected["meal_count"] == 3
+    for name in crud.DAILY_TOTAL_COLUMNS:
+        assert stats[name] == expected[name]
+    assert stats["total_calories"] == 1150
+    assert stats["total_protein"] == 46.5
+
+
+def test_first_meal_of_a_day_includes_older_meals(client, db):
+    # Meal recorded before daily_totals existed: no row for its day
+    db.add(models.Meal(user_id=client.user_id, name="Ancien", meal_type="dîner",
+                       calories=400, protein=20, carbs=30, fat=10, date=DAY))
+    db.commit()
+    assert crud.get_day(db, client.user_id, DAY)[1]["total_calories"] == 400
+
+    crud.create_meal(db, meal(client.user_id, 100))
+    total = db.get(models.DailyTotal, (client.user_id, DAY))
+    assert (total.total_calories, total.meal_count) == (500, 2)
+
+
+def test_day_endpoint_reads_meals_and_totals_in_one_query(client):
+    for calories in (300, 450):
+        assert client.post("/api/meals", json=meal(client.user_id, calories).model_dump()).status_code == 200
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "meals" in statement or "daily_totals" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"/api/meals/date/{DAY}")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["calories"] for m in body["meals"]] == [300, 450]
+    assert body["stats"]["total_calories"] == 750
+    assert body["stats"]["meal_count"] == 2
+    assert len(statements) == 1
+
+
+def test_empty_day(client):
+    body = client.get("/api/meals/date/2000-01-01").json()
+    assert body["meals"] == []
+    assert body["stats"]["meal_count"] == 0
+    assert body["stats"]["total_calories"] == 0
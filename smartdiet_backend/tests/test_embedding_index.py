@@ -0,0 +1,62 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+import torch
+from torchvision import models
+
+from embedding_index import EmbeddingIndex, FeatureExtractor, add_and_save
+
+DIM = 8
+
+
+def vector(seed):
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+def test_search_keeps_best_reference_per_food():
+    index = EmbeddingIndex(DIM)
+    index.add(np.stack([vector(1), vector(2)]), "pomme", food_id=1)
+    index.add(vector(3), "poire", food_id=2)
+    results = index.search(vector(1) / np.linalg.norm(vector(1)), k=2)
+    assert [r["food_name"] for r in results] == ["pomme", "poire"]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_stale_writer_keeps_other_workers_additions(tmp_path):
+    path = str(tmp_path / "index.npz")
+    first = EmbeddingIndex.load(path, DIM)
+    second = EmbeddingIndex.load(path, DIM)
+    first = add_and_save(first, path, vector(1), "pomme")
+    second = add_and_save(second, path, vector(2), "poire")
+    assert EmbeddingIndex.load(path, DIM).labels == ["pomme", "poire"]
+    assert second.labels == ["pomme", "poire"]
+
+
+def _add_references(path, worker):
+    index = EmbeddingIndex.load(path, DIM)
+    for i in range(25):
+        index = add_and_save(index, path, vector(worker * 10 + i), f"food-{worker}-{i}")
+
+
+def test_concurrent_workers_lose_no_additions(tmp_path):
+    path = str(tmp_path / "index.npz")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_references, args=(path, worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    assert len(EmbeddingIndex.load(path, DIM)) == 100
+
+
+def test_extractor_reads_local_backbone(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        FeatureExtractor(weights_path=str(tmp_path / "missing.pth"))
+
+    path = str(tmp_path / "backbone.pth")
+    torch.save(models.mobilenet_v2(weights=None).features.state_dict(), path)
+    extractor = FeatureExtractor(weights_path=path)
+    features = extractor(torch.zeros(2, 3, 64, 64))
+    assert features.shape == (2, extractor.dim)
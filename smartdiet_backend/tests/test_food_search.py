@@ -0,0 +1,75 @@
+import food_search
+import models
+from catalogue import CataloguePoller
+
+
+def add_foods(db, *foods):
+    for name, calories in foods:
+        db.add(models.Food(name=name, category="Fruits", calories=calories, protein=0.5,
+                           carbs=12.0, fat=0.2, grams=100))
+    db.commit()
+
+
+def search(index, query):
+    snapshot = index.current()
+    return [snapshot.to_dict(row) for _, row in snapshot.search(food_search.normalize_name(query))]
+
+
+def test_update_changes_results_and_etag(db):
+    add_foods(db, ("Pomme", 52), ("Poire", 57))
+    index = food_search.FoodSearchIndex(poller=CataloguePoller(refresh_seconds=0))
+    assert search(index, "pomme")[0]["calories"] == 52
+    etag = index.snapshot.etag
+
+    # Same row count and max id: only the version counter changes
+    db.query(models.Food).filter(models.Food.name == "Pomme").update({"calories": 999})
+    db.commit()
+    assert index.refresh()
+    assert search(index, "pomme")[0]["calories"] == 999
+    assert index.snapshot.etag != etag
+    etag = index.snapshot.etag
+
+    db.query(models.Food).filter(models.Food.name == "Pomme").update({"name": "Pomme Gala"})
+    db.commit()
+    assert index.refresh()
+    assert [food["name"] for food in search(index, "gala")] == ["Pomme Gala"]
+    assert index.snapshot.etag != etag
+
+
+def test_unchanged_catalogue_keeps_snapshot(db):
+    add_foods(db, ("Pomme", 52))
+    index = food_search.FoodSearchIndex(poller=CataloguePoller(refresh_seconds=0))
+    index.refresh()
+    assert not index.refresh()
+    assert index.version == 1
+
+
+def snapshot(*names):
+    rows = [(i, name, "Divers", 100, 50, 1, 10, 1) for i, name in enumerate(names, start=1)]
+    return food_search.CatalogueSnapshot(rows, '"test"')
+
+
+def names(catalogue, query, limit=20):
+    return [catalogue.names[row] for _, row in catalogue.search(food_search.normalize_name(query), limit)]
+
+
+def test_short_query_falls_back_to_substring():
+    catalogue = snapshot("Pomme", "Ananas", "Thé vert", "Café")
+    # Not a word prefix, too short for trigrams
+    assert names(catalogue, "na") == ["Ananas"]
+    # Accent-insensitive: "é" matches every "e"
+    assert names(catalogue, "é") == ["Café", "Pomme", "Thé vert"]
+    # Word prefixes still rank first
+    assert names(catalogue, "po") == ["Pomme"]
+
+
+def test_ranking_classes():
+    catalogue = snapshot("Pâtes complètes", "Pâté de campagne", "Pâte", "Sauce pâte", "Tapenade")
+    assert names(catalogue, "pate") == ["Pâte", "Pâté de campagne", "Pâtes complètes", "Sauce pâte"]
+
+
+def test_fuzzy_matches_respect_min_similarity():
+    catalogue = snapshot("Banane", "Mangue")
+    assert names(catalogue, "banan") == ["Banane"]
+    assert names(catalogue, "bananne") == ["Banane"]
+    assert names(catalogue, "xyz") == []
@@ -0,0 +1,38 @@
+import pytest
+
+import food_search
+import import_foods
+import models
+from catalogue import CataloguePoller
+from database import engine
+
+
+@pytest.fixture
+def csv_file(tmp_path, db):
+    yield tmp_path / "foods.csv"
+    import_foods.import_metadata.drop_all(bind=engine)
+
+
+def test_parse_quantity():
+    assert import_foods.parse_quantity("1 cup (240 ml)") == 240.0
+    assert import_foods.parse_quantity("30g") == 30.0
+    assert import_foods.parse_quantity("une portion") is None
+
+
+def test_update_only_import_refreshes_search(db, csv_file):
+    db.add(models.Food(name="Pomme", category="Fruits", calories=52, grams=100))
+    db.commit()
+    index = food_search.FoodSearchIndex(poller=CataloguePoller(refresh_seconds=0))
+    index.refresh()
+    etag = index.snapshot.etag
+
+    csv_file.write_text("name,category,calories,grams\nPomme,Fruits,60,100\nPomme,Fruits,55,100\n")
+    assert import_foods.stage(str(csv_file)) == 2
+    assert import_foods.merge(str(csv_file)) == (0, 1)
+
+    db.expire_all()
+    assert db.query(models.Food.calories).filter(models.Food.name == "Pomme").scalar() == 55
+    assert index.refresh()
+    assert index.snapshot.etag != etag
+    row = index.snapshot.search("pomme")[0][1]
+    assert index.snapshot.to_dict(row)["calories"] == 55
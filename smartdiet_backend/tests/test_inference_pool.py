@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+import main
+from inference_pool import InferencePool, PoolSaturatedError
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    # Never leave pool threads blocked behind a failed assertion
+    event.set()
+
+
+def drain(pool, futures):
+    for future in futures:
+        future.result(timeout=5)
+    # Slots are released by done-callbacks, which run just after the result is set
+    deadline = time.monotonic() + 5
+    while pool.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_admits_workers_plus_pending(release):
+    pool = InferencePool(workers=1, max_pending=1, retry_after=3)
+    futures = [pool.submit(release.wait, 5) for _ in range(2)]
+    assert pool.stats()["in_flight"] == 2
+
+    with pytest.raises(PoolSaturatedError) as error:
+        pool.submit(release.wait, 5)
+    assert error.value.retry_after == 3
+
+    release.set()
+    drain(pool, futures)
+    # Slots are given back once the work is done
+    pool.submit(lambda: None).result(timeout=5)
+
+
+def test_saturated_pool_returns_503_with_retry_after(client, monkeypatch, release):
+    pool = InferencePool(workers=1, max_pending=1, retry_after=7)
+    monkeypatch.setattr(main, "inference_pool", pool)
+    monkeypatch.setattr(main, "call_food_service", lambda method, *args: {"method": method})
+    blockers = [pool.submit(release.wait, 5) for _ in range(pool.workers + pool.max_pending)]
+
+    files = {"file": ("photo.jpg", b"not really a jpeg", "image/jpeg")}
+    response = client.post("/api/ai/recognize-food", files=files)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+    release.set()
+    drain(pool, blockers)
+    response = client.post("/api/ai/recognize-food", files=files)
+    assert response.status_code == 200
+    assert response.json() == {"method": "predict"}
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+from inference_pool import InferencePool
+from jobs import JobStore
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def store(**kwargs):
+    return JobStore(InferencePool(workers=1, max_pending=8), **kwargs)
+
+
+def finish(jobs, job):
+    job.future.result(timeout=5)
+    return jobs.get(job.id)
+
+
+def test_job_lifecycle(release):
+    jobs = store()
+    job = jobs.submit(lambda: release.wait(5) and {"food_name": "Banane"})
+    assert job.status in ("queued", "running")
+
+    # Long-poll gives up after its timeout, the job keeps running
+    started = time.monotonic()
+    assert not asyncio.run(jobs.wait(job, 0.1)).finished
+    assert time.monotonic() - started >= 0.1
+    assert jobs.stats()["pending"] == 1
+
+    release.set()
+    job = asyncio.run(jobs.wait(job, 5))
+    assert job.to_dict()["status"] == "done"
+    assert job.to_dict()["result"] == {"food_name": "Banane"}
+    assert job.finished_at is not None
+
+
+@pytest.mark.parametrize("fn, error", [
+    (lambda: {"error": "cannot identify image file"}, "cannot identify image file"),
+    (lambda: 1 / 0, "division by zero"),
+])
+def test_errors_mark_the_job_failed(fn, error):
+    jobs = store()
+    job = finish(jobs, jobs.submit(fn))
+    assert job.to_dict() == {
+        "job_id": job.id, "status": "failed", "submitted_at": job.submitted_at,
+        "finished_at": job.finished_at, "error": error,
+    }
+    assert jobs.stats()["failed"] == 1
+
+
+def test_finished_jobs_expire_after_ttl():
+    jobs = store(ttl=0.05)
+    job = finish(jobs, jobs.submit(lambda: {"food_name": "Pomme"}))
+    assert job is not None
+    time.sleep(0.1)
+    assert jobs.get(job.id) is None
+
+
+def test_oldest_finished_jobs_are_dropped_beyond_max_entries(release):
+    jobs = store(max_entries=2)
+    running = jobs.submit(release.wait, 5)
+    first = jobs.submit(lambda: {})
+    release.set()
+    finish(jobs, running)
+    finish(jobs, first)
+
+    third = jobs.submit(lambda: {})
+    # Room is made by dropping the oldest finished job only
+    assert jobs.get(running.id) is None
+    assert jobs.get(first.id) is not None
+    assert finish(jobs, third) is not None
+    assert jobs.stats()["stored"] == 2
+
+
+def test_unfinished_jobs_are_never_evicted(release):
+    jobs = store(max_entries=1)
+    running = jobs.submit(release.wait, 5)
+    queued = jobs.submit(release.wait, 5)
+    assert jobs.get(running.id) is running
+    assert jobs.get(queued.id) is queued
+    release.set()
+
+
+def test_job_routes(client, monkeypatch):
+    monkeypatch.setattr(main, "recognition_jobs", store())
+    monkeypatch.setattr(main, "call_food_service", lambda method, data: {"method": method, "size": len(data)})
+
+    response = client.post("/api/ai/recognize-food/jobs", files={"file": ("photo.jpg", b"12345", "image/jpeg")})
+    assert response.status_code == 202
+    poll_url = response.json()["poll_url"]
+
+    body = client.get(poll_url, params={"wait": 5}).json()
+    assert body["status"] == "done"
+    assert body["result"] == {"method": "predict", "size": 5}
+    assert client.get("/api/ai/recognize-food/jobs/unknown").status_code == 404
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from ml_service import MicroBatcher
+
+
+def test_batches_are_split_at_max_size():
+    sizes = []
+    release = threading.Event()
+
+    def run_batch(items):
+        # Hold the first batch so the rest of the submissions queue up behind it
+        release.wait(timeout=5)
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(10)]
+    release.set()
+
+    assert [future.result(timeout=5) for future in futures] == [i * 2 for i in range(10)]
+    assert sum(sizes) == 10
+    assert max(sizes) <= 4
+    assert len(sizes) >= 3
+
+
+def test_concurrent_callers_get_their_own_result():
+    batcher = MicroBatcher(lambda items: [f"result-{item}" for item in items], max_batch_size=8, max_wait_ms=5)
+    results = {}
+
+    def call(i):
+        results[i] = batcher.submit(i).result(timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: f"result-{i}" for i in range(32)}
+
+
+def test_failed_batch_only_fails_its_callers():
+    def run_batch(items):
+        if "bad" in items:
+            raise ValueError("corrupt image")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_ms=0)
+    good, bad, after = batcher.submit("ok"), batcher.submit("bad"), batcher.submit("next")
+
+    assert good.result(timeout=5) == "OK"
+    with pytest.raises(ValueError, match="corrupt image"):
+        bad.result(timeout=5)
+    # The worker survives the failure
+    assert after.result(timeout=5) == "NEXT"
+
+
+def test_per_item_errors_reach_the_matching_caller():
+    batcher = MicroBatcher(
+        lambda items: [{"error": "decode failed"} if item < 0 else item for item in items],
+        max_batch_size=8, max_wait_ms=20,
+    )
+    futures = [batcher.submit(item) for item in (1, -1, 2)]
+    assert [future.result(timeout=5) for future in futures] == [1, {"error": "decode failed"}, 2]
+
+
+def test_cancelled_callers_are_skipped():
+    seen = []
+    release = threading.Event()
+
+    def run_batch(items):
+        release.wait(timeout=5)
+        seen.extend(items)
+        return items
+
+    batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit("first")
+    cancelled = batcher.submit("cancelled")
+    assert cancelled.cancel()
+    last = batcher.submit("last")
+    release.set()
+
+    assert first.result(timeout=5) == "first"
+    assert last.result(timeout=5) == "last"
+    assert "cancelled" not in seen
@@ -0,0 +1,52 @@
+import sys
+
+import pytest
+import torch
+
+import ml_backends
+
+CPU = torch.device("cpu")
+
+
+def test_int8_dynamic_is_served_as_int8_static(tmp_path):
+    model_path = str(tmp_path / "model.pth")
+    export_dir = str(tmp_path / "exported")
+    torch.save(ml_backends.build_model(2).state_dict(), model_path)
+
+    # No exported graph yet: eager
+    assert ml_backends.load_backend("int8_dynamic", model_path, 2, CPU, export_dir).name == "eager"
+
+    ml_backends.export("int8_static", model_path, 2, None, 8, export_dir)
+    backend = ml_backends.load_backend("int8_dynamic", model_path, 2, CPU, export_dir)
+    assert backend.name == "int8_static"
+    assert backend(torch.randn(2, 3, ml_backends.INPUT_SIZE, ml_backends.INPUT_SIZE)).shape == (2, 2)
+
+
+def test_unknown_backend_falls_back_to_eager(tmp_path):
+    model_path = str(tmp_path / "model.pth")
+    torch.save(ml_backends.build_model(3).state_dict(), model_path)
+    assert ml_backends.load_backend("tensorrt", model_path, 3, CPU, str(tmp_path)).name == "eager"
+
+
+def test_cascade_parity_reports_agreement_and_threshold(tmp_path):
+    model_path = str(tmp_path / "model.pth")
+    torch.save(ml_backends.build_model(2).state_dict(), model_path)
+
+    report = ml_backends.cascade_parity("eager", model_path, 2, None, 16, resolution=96, threshold=0.0,
+                                        min_agreement=0.0, export_dir=str(tmp_path))
+
+    assert report["samples"] == 16
+    assert report["accepted_rate"] == 1.0
+    assert report["accepted_top1_agreement"] == report["top1_agreement"]
+    # Every image is accepted at the lowest observed confidence
+    assert 50.0 <= report["suggested_threshold"] <= 100.0
+
+
+def test_onnx_without_onnxruntime_is_a_clear_error(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pth")
+    torch.save(ml_backends.build_model(2).state_dict(), model_path)
+    # None in sys.modules makes the import fail
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+
+    with pytest.raises(RuntimeError, match="requirements-onnx.txt"):
+        ml_backends.load_backend("onnx", model_path, 2, CPU, str(tmp_path))
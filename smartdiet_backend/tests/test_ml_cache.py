@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import ml_cache
+from ml_cache import PerceptualIndex, ResultCache, content_key, dhash
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_content_key_depends_on_bytes_and_model_version():
+    assert content_key(b"image", "v1") == content_key(b"image", "v1")
+    assert content_key(b"image", "v1") != content_key(b"image", "v2")
+    assert content_key(b"image", "v1") != content_key(b"other", "v1")
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, max_bytes=10_000, ttl=60)
+    cache.put("a", {"food": "pomme"})
+    cache.put("b", {"food": "poire"})
+    assert cache.get("a") == {"food": "pomme"}  # "b" is now the least recently used
+    cache.put("c", {"food": "banane"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"food": "pomme"}
+    assert cache.get("c") == {"food": "banane"}
+    assert cache.stats()["entries"] == 2
+
+
+def test_result_cache_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ml_cache.time, "monotonic", clock)
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl=30)
+    cache.put("a", {"food": "pomme"})
+    clock.now += 29
+    assert cache.get("a") == {"food": "pomme"}
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_cache_byte_budget():
+    cache = ResultCache(max_entries=100, max_bytes=100, ttl=60)
+    cache.put("huge", {"food": "x" * 200})
+    assert cache.get("huge") is None
+    for i in range(10):
+        cache.put(f"k{i}", {"food": "pomme"})
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert cache.get("k9") == {"food": "pomme"}
+    assert cache.get("k0") is None
+
+
+def flip_bits(value, count):
+    for bit in range(count):
+        value ^= 1 << bit
+    return value
+
+
+def test_perceptual_index_threshold():
+    index = PerceptualIndex(max_entries=10, threshold=4)
+    index.add(0b1010, "v1", {"food": "pomme"})
+    assert index.lookup(flip_bits(0b1010, 4), "v1") == {"food": "pomme"}
+    assert index.lookup(flip_bits(0b1010, 5), "v1") is None
+    # Predictions of another model version are never reused
+    assert index.lookup(0b1010, "v2") is None
+
+
+def test_perceptual_index_returns_closest_match():
+    index = PerceptualIndex(max_entries=10, threshold=4)
+    index.add(0, "v1", {"food": "far"})
+    index.add(flip_bits(0, 3), "v1", {"food": "near"})
+    assert index.lookup(flip_bits(0, 2), "v1") == {"food": "near"}
+
+
+def test_perceptual_index_evicts_least_recently_matched():
+    index = PerceptualIndex(max_entries=2, threshold=0)
+    index.add(1, "v1", "a")
+    index.add(2, "v1", "b")
+    assert index.lookup(1, "v1") == "a"
+    index.add(3, "v1", "c")
+    assert index.lookup(2, "v1") is None
+    assert index.lookup(1, "v1") == "a"
+
+
+def test_perceptual_index_disabled_by_negative_threshold():
+    index = PerceptualIndex(max_entries=10, threshold=-1)
+    index.add(1, "v1", "a")
+    assert index.lookup(1, "v1") is None
+
+
+def photo(seed):
+    # Smooth random blobs, closer to a photo than pure noise
+    blocks = np.random.default_rng(seed).integers(0, 256, size=(6, 6, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((256, 256), Image.BICUBIC)
+
+
+def test_dhash_survives_reencoding():
+    image = photo(1)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    reencoded = Image.open(io.BytesIO(buffer.getvalue()))
+
+    distance = (dhash(image) ^ dhash(reencoded)).bit_count()
+    assert distance <= ml_cache.PHASH_THRESHOLD
+    assert (dhash(image) ^ dhash(photo(2))).bit_count() > ml_cache.PHASH_THRESHOLD
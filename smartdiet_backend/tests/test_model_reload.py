@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+import ml_backends
+import ml_service
+import model_registry
+
+
+@pytest.fixture
+def service(db, tmp_path, monkeypatch):
+    # Relative registry / legacy model paths resolve inside tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ml_service, "WARMUP_ON_LOAD", False)
+    torch.save(ml_backends.build_model(2).state_dict(), model_registry.LEGACY_MODEL_PATH)
+    service = ml_service.FoodReconService()
+    service._watched_signature = model_registry.signature()
+    return service
+
+
+def test_failed_reload_is_retried(service, monkeypatch):
+    first_version = service.model_version
+    assert first_version is not None
+    attempts = []
+    load = service._load
+    monkeypatch.setattr(service, "_load", lambda version=None: attempts.append(version) or load(version))
+
+    # Half-copied checkpoint: the old model stays live and the error is reported
+    with open(model_registry.LEGACY_MODEL_PATH, "wb") as f:
+        f.write(b"truncated")
+    service._check_registry()
+    assert service.model_version == first_version
+    assert service.last_error
+
+    # Same file on the next poll: tried again, not skipped as already seen
+    service._check_registry()
+    assert len(attempts) == 2
+
+    torch.save(ml_backends.build_model(2).state_dict(), model_registry.LEGACY_MODEL_PATH)
+    service._check_registry()
+    assert service.model_version not in (None, first_version)
+    assert service.last_error is None
+
+    # Recorded once served: nothing to do until the registry changes again
+    service._check_registry()
+    assert len(attempts) == 3
+
+
+def test_load_model_reports_whether_a_model_is_served(service):
+    with open(model_registry.LEGACY_MODEL_PATH, "wb") as f:
+        f.write(b"not a checkpoint")
+    assert service.load_model() is True  # previous model still served
+    assert service.last_error
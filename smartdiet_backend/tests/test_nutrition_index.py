@@ -0,0 +1,30 @@
+import models
+from catalogue import CataloguePoller
+from nutrition_index import NutritionIndex
+
+
+def test_edited_food_is_picked_up(db):
+    db.add(models.Food(name="Banane", calories=89, protein=1.1, carbs=22.8, fat=0.3, grams=100))
+    db.commit()
+    index = NutritionIndex(poller=CataloguePoller(refresh_seconds=0))
+    assert index.refresh()
+    assert index.lookup("banana")["nutrition"]["calories"] == 89
+
+    db.query(models.Food).filter(models.Food.name == "Banane").update({"calories": 95, "grams": 200})
+    db.commit()
+    assert index.refresh()
+    assert index.lookup("banana")["nutrition"]["calories"] == 47.5
+    assert not index.refresh()
+
+
+def test_on_change_follows_rebuilds(db):
+    changes = []
+    index = NutritionIndex(poller=CataloguePoller(refresh_seconds=0), on_change=lambda: changes.append(1))
+    index.refresh()
+    assert not index.refresh()
+    assert len(changes) == 1
+
+    db.add(models.Food(name="Pomme", calories=52, grams=100))
+    db.commit()
+    assert index.refresh()
+    assert len(changes) == 2
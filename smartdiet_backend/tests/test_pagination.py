@@ -0,0 +1,86 @@
+import pytest
+from fastapi import HTTPException
+
+import schemas
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, next_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-10-17T08:30:00.123456", 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["2026-10-17T08:30:00.123456", 42]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor(1, 2, 3), "e30", ""])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor, 2)
+    assert raised.value.status_code == 400
+
+
+def test_next_cursor_only_for_full_pages():
+    assert next_cursor([1, 2, 3], 3, str) == "3"
+    assert next_cursor([1, 2], 3, str) is None
+    assert next_cursor([], 3, str) is None
+
+
+def collect_pages(client, path, limit):
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_meals_pages_do_not_overlap(client):
+    for i in range(7):
+        response = client.post("/api/meals", json={
+            "user_id": client.user_id, "name": f"Repas {i}", "meal_type": "déjeuner",
+            "calories": 100 + i, "protein": 10, "carbs": 20, "fat": 5, "date": "2026-10-17",
+        })
+        assert response.status_code == 200, response.text
+
+    pages = collect_pages(client, "/api/meals", 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [meal["id"] for page in pages for meal in page]
+    assert len(set(ids)) == 7
+    # Newest first
+    assert [meal["name"] for meal in pages[0]] == ["Repas 6", "Repas 5", "Repas 4"]
+    # Rows are served without response_model: they must still match the documented schema
+    for meal in pages[0]:
+        assert meal.keys() == schemas.MealResponse.model_fields.keys()
+        schemas.MealResponse.model_validate(meal)
+
+
+def test_weight_pages_do_not_overlap(client):
+    for day in range(1, 7):
+        response = client.post("/api/weight", json={
+            "user_id": client.user_id, "weight": 70 - day / 10, "date": f"2026-10-{day:02d}",
+        })
+        assert response.status_code == 200, response.text
+
+    pages = collect_pages(client, "/api/weight", 2)
+    assert [len(page) for page in pages] == [2, 2, 2, 0]
+    ids = [log["id"] for page in pages for log in page]
+    assert len(set(ids)) == 6
+    dates = [log["date"] for page in pages for log in page]
+    assert dates == sorted(dates, reverse=True)
+    for log in pages[0]:
+        assert log.keys() == schemas.WeightLogResponse.model_fields.keys()
+        schemas.WeightLogResponse.model_validate(log)
+
+
+def test_malformed_cursor_returns_400(client):
+    assert client.get("/api/meals", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/weight", params={"cursor": encode_cursor("2026-10-17")}).status_code == 400
+
+
+@pytest.mark.parametrize("path, schema", [("/api/meals", "MealResponse"), ("/api/weight", "WeightLogResponse")])
+def test_openapi_documents_pages(client, path, schema):
+    response = client.get("/openapi.json").json()["paths"][path]["get"]["responses"]["200"]
+    assert response["content"]["application/json"]["schema"]["items"]["$ref"].endswith(f"/{schema}")
+    assert NEXT_CURSOR_HEADER in response["headers"]
@@ -0,0 +1,26 @@
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from train_model import train_head_mode
+
+
+def test_head_training_leaves_backbone_batchnorm_statistics_alone():
+    torch.manual_seed(0)
+    model = models.mobilenet_v2(weights=None)
+    for param in model.parameters():
+        param.requires_grad = False
+    model.classifier[1] = nn.Linear(model.last_channel, 2)
+    before = {k: v.clone() for k, v in model.features.state_dict().items()}
+
+    train_head_mode(model)
+    assert model.classifier.training and not model.features.training
+    optimizer = torch.optim.Adam(model.classifier.parameters(), lr=0.1)
+    for _ in range(3):
+        optimizer.zero_grad()
+        loss = nn.functional.cross_entropy(model(torch.rand(4, 3, 64, 64) * 5), torch.tensor([0, 1, 0, 1]))
+        loss.backward()
+        optimizer.step()
+
+    after = model.features.state_dict()
+    assert all(torch.equal(before[k], after[k]) for k in before)
@@ -0,0 +1,83 @@
+import asyncio
+import io
+import tempfile
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from buffers import BufferReader
+from ml_preprocess import decode_image
+from uploads import extract_archive, read_upload
+
+
+def upload_of(data, size=True):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(data)
+    spooled.seek(0)
+    return UploadFile(spooled, size=len(data) if size else None, filename="photo.jpg")
+
+
+def read(data, size=True, **kwargs):
+    return asyncio.run(read_upload(upload_of(data, size), **kwargs))
+
+
+def jpeg(width=64, height=48):
+    pixels = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format="JPEG")
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("size", [True, False])
+def test_read_upload_returns_the_whole_file(size):
+    data = bytes(range(256)) * 1000
+    contents = read(data, size)
+    assert isinstance(contents, memoryview)
+    assert contents == data
+
+
+def test_read_upload_rejects_oversized_files_without_a_size():
+    with pytest.raises(HTTPException) as error:
+        read(b"x" * 1001, size=False, max_bytes=1000, chunk_size=100)
+    assert error.value.status_code == 413
+
+
+def test_read_upload_holds_a_single_copy():
+    data = b"x" * (4 * 1024 * 1024)
+    upload = upload_of(data)
+    tracemalloc.start()
+    try:
+        contents = asyncio.run(read_upload(upload, max_bytes=len(data)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(contents) == len(data)
+    # One preallocated buffer plus a chunk in flight, no joined copy
+    assert peak < 1.25 * len(data)
+
+
+def test_buffer_reader_decodes_images_and_archives():
+    data = jpeg()
+    image = decode_image(memoryview(bytearray(data)))
+    assert image.size == (64, 48)
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        archive.writestr("a.jpg", data)
+    assert extract_archive(memoryview(bytearray(output.getvalue()))) == [("a.jpg", data)]
+
+
+def test_buffer_reader_seeks_like_a_file():
+    reader = BufferReader(bytearray(b"0123456789"))
+    assert reader.read(3) == b"012"
+    assert reader.seek(-2, io.SEEK_END) == 8
+    assert reader.read() == b"89"
+    assert reader.read(1) == b""
+    reader.seek(4)
+    assert reader.tell() == 4
+    with pytest.raises(ValueError):
+        reader.seek(-1)
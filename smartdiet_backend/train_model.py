@@ -1,53 +1,346 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
 from torchvision import datasets, transforms, models
+from dataclasses import dataclass
+import argparse
+import hashlib
+import json
 import os
+import random
+import time
+import numpy as np
 import matplotlib.pyplot as plt
+from dataset_shards import SHARDS_DIR, ShardDataset, ensure_shards, fingerprint
 
-def train_model():
+EMBEDDING_CACHE_DIR = "embedding_cache"
+# Files (size + mtime) the saved model has been trained on, for --incremental
+TRAINING_MANIFEST_PATH = "training_manifest.json"
+# Old samples replayed next to the new ones in --incremental mode, to avoid forgetting
+REPLAY_RATIO = 1.0  # replayed samples per new sample
+REPLAY_MIN = 64
+
+# Leave one core for the training loop itself
+DEFAULT_WORKERS = max(0, min(4, (os.cpu_count() or 1) - 1))
+
+# Everything that changes what the frozen backbone sees. Bump it whenever the
+# preprocessing or backbone weights change so cached embeddings are rebuilt.
+EMBEDDING_SIGNATURE = "mobilenet_v2/IMAGENET1K_V2|resize224|imagenet-norm|views:orig,hflip|v1"
+
+
+def _embedding_cache_key(dataset):
+    """Changes with any image of the dataset or with EMBEDDING_SIGNATURE."""
+    if isinstance(dataset, ShardDataset):
+        source = f"shards:{dataset.fingerprint}"
+    else:
+        source = f"folder:{fingerprint(dataset.samples)}"
+    return hashlib.sha256(f"{EMBEDDING_SIGNATURE}|{source}".encode()).hexdigest()[:16]
+
+
+@dataclass
+class LoaderConfig:
+    num_workers: int = DEFAULT_WORKERS
+    prefetch_factor: int = 4  # batches prepared ahead by each worker
+    persistent_workers: bool = True  # keep workers alive between epochs
+    seed: int = 42
+    intra_op_threads: int = 0  # torch threads for the training process, 0 = default
+
+
+def _seed_worker(worker_id):
+    # torch already gives each worker base_seed + worker_id, derive the other RNGs from it
+    worker_seed = torch.initial_seed() % 2**32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+    # Workers decode/augment in parallel, avoid oversubscribing the cores
+    torch.set_num_threads(1)
+
+
+def make_dataloader(dataset, batch_size, shuffle, config, device):
+    """Multi-process DataLoader with prefetching and reproducible shuffling/augmentation."""
+    generator = torch.Generator()
+    generator.manual_seed(config.seed)
+    options = {}
+    if config.num_workers > 0:
+        options = {
+            "prefetch_factor": config.prefetch_factor,
+            "persistent_workers": config.persistent_workers,
+        }
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=config.num_workers,
+        pin_memory=device.type == "cuda",
+        worker_init_fn=_seed_worker,
+        generator=generator,
+        **options,
+    )
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _sample_signatures(dataset, data_dir):
+    """{path relative to data_dir: "size|mtime_ns|label"} for every image of an ImageFolder."""
+    signatures = {}
+    for path, label in dataset.samples:
+        stat = os.stat(path)
+        signatures[os.path.relpath(path, data_dir)] = f"{stat.st_size}|{stat.st_mtime_ns}|{label}"
+    return signatures
+
+
+def load_manifest(path=TRAINING_MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(dataset, data_dir, model_path, path=TRAINING_MANIFEST_PATH):
+    """Records every image of `dataset` as consumed by the model saved at `model_path`."""
+    manifest = {
+        "classes": dataset.classes,
+        "model_digest": _file_digest(model_path),
+        "files": _sample_signatures(dataset, data_dir),
+    }
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def incremental_indices(dataset, data_dir, model_path, manifest, seed):
+    """
+    (new, replay) sample indices for a delta pass: images added or modified
+    since the manifest, plus a random replay buffer of already consumed ones.
+    Returns None when the manifest can't be used and a full pass is needed.
+    """
+    if manifest is None or not os.path.exists(model_path):
+        print("No training manifest or model yet, running a full pass")
+        return None
+    if manifest["classes"] != dataset.classes:
+        print(f"Classes changed ({manifest['classes']} -> {dataset.classes}), running a full pass")
+        return None
+    if manifest["model_digest"] != _file_digest(model_path):
+        print(f"{model_path} was not produced by the last recorded run, running a full pass")
+        return None
+
+    consumed = manifest["files"]
+    new, old = [], []
+    for index, (name, signature) in enumerate(_sample_signatures(dataset, data_dir).items()):
+        (old if consumed.get(name) == signature else new).append(index)
+
+    replay_size = min(len(old), max(REPLAY_MIN, int(REPLAY_RATIO * len(new))))
+    replay = random.Random(seed).sample(old, replay_size) if new else []
+    return new, replay
+
+
+def _timing_report(data_time, compute_time):
+    total = data_time + compute_time
+    share = 100 * data_time / total if total else 0.0
+    return f"data wait: {data_time:.2f}s, compute: {compute_time:.2f}s ({share:.0f}% waiting on data)"
+
+
+def embed(model, inputs):
+    """Frozen MobileNetV2 features, i.e. the input of model.classifier."""
+    features = model.features(inputs)
+    features = nn.functional.adaptive_avg_pool2d(features, (1, 1))
+    return torch.flatten(features, 1)
+
+
+def load_or_compute_embeddings(model, dataset, device, batch_size, loader_config=None,
+                               cache_dir=EMBEDDING_CACHE_DIR):
+    """
+    Returns (embeddings, labels). Embeddings are a read-only memory-mapped
+    [2, N, last_channel] array holding each image and its horizontal flip, so
+    the flip augmentation survives caching. The cache is reused until an image
+    is added, removed or modified, or EMBEDDING_SIGNATURE changes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = _embedding_cache_key(dataset)
+    embeddings_path = os.path.join(cache_dir, f"{key}.npy")
+    labels_path = os.path.join(cache_dir, f"{key}.labels.npy")
+
+    if os.path.exists(embeddings_path) and os.path.exists(labels_path):
+        print(f"Using cached embeddings {embeddings_path}")
+        return np.load(embeddings_path, mmap_mode="r"), np.load(labels_path)
+
+    print(f"Computing embeddings for {len(dataset)} images (cache key {key})...")
+    # Drop caches of previous dataset states
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npy") and not name.startswith(key):
+            os.remove(os.path.join(cache_dir, name))
+
+    tmp_path = embeddings_path + ".tmp"
+    embeddings = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(2, len(dataset), model.last_channel)
+    )
+    labels = np.empty(len(dataset), dtype=np.int64)
+
+    loader = make_dataloader(dataset, batch_size, False, loader_config or LoaderConfig(), device)
+    model.eval()
+    offset = 0
+    data_time = compute_time = 0.0
+    with torch.no_grad():
+        tick = time.perf_counter()
+        for inputs, targets in loader:
+            loaded = time.perf_counter()
+            data_time += loaded - tick
+
+            inputs = inputs.to(device, non_blocking=True)
+            count = inputs.shape[0]
+            embeddings[0, offset:offset + count] = embed(model, inputs).cpu().numpy()
+            embeddings[1, offset:offset + count] = embed(model, torch.flip(inputs, dims=[3])).cpu().numpy()
+            labels[offset:offset + count] = targets.numpy()
+            offset += count
+
+            tick = time.perf_counter()
+            compute_time += tick - loaded
+    print(f"Embeddings computed - {_timing_report(data_time, compute_time)}")
+
+    embeddings.flush()
+    del embeddings
+    # np.save appends .npy to names that lack it, so write labels via a handle
+    with open(labels_path + ".tmp", "wb") as f:
+        np.save(f, labels)
+    os.replace(labels_path + ".tmp", labels_path)
+    os.replace(tmp_path, embeddings_path)
+    return np.load(embeddings_path, mmap_mode="r"), labels
+
+
+def train_head_mode(model):
+    """
+    Training mode for the head only: the frozen backbone stays in eval mode so
+    its BatchNorm layers keep their ImageNet running statistics instead of
+    drifting towards the (small, in --incremental mode) training subset.
+    """
+    model.eval()
+    model.classifier.train()
+
+
+def train_head_on_embeddings(model, embeddings, labels, criterion, optimizer, device,
+                             num_epochs, batch_size):
+    """Trains model.classifier directly on cached embeddings, one random view per sample."""
+    labels = torch.from_numpy(labels)
+    num_samples = labels.shape[0]
+    loss_history = []
+
+    for epoch in range(num_epochs):
+        model.classifier.train()
+        running_loss = 0.0
+        correct = 0
+        num_batches = 0
+
+        permutation = torch.randperm(num_samples).numpy()
+        for start in range(0, num_samples, batch_size):
+            indices = permutation[start:start + batch_size]
+            views = np.random.randint(0, 2, size=len(indices))
+            inputs = torch.from_numpy(np.ascontiguousarray(embeddings[views, indices])).to(device)
+            targets = labels[indices].to(device)
+
+            optimizer.zero_grad()
+            outputs = model.classifier(inputs)
+            loss = criterion(outputs, targets)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item()
+            correct += (outputs.argmax(dim=1) == targets).sum().item()
+            num_batches += 1
+
+        epoch_loss = running_loss / num_batches
+        epoch_acc = 100 * correct / num_samples
+        loss_history.append(epoch_loss)
+        print(f"Epoch [{epoch+1}/{num_epochs}] Loss: {epoch_loss:.4f} Acc: {epoch_acc:.2f}%")
+
+    return loss_history
+
+
+def train_model(cache_embeddings=False, use_shards=False, loader_config=None, incremental=False):
     # 1. Configuration
     DATA_DIR = "dataset"
     MODEL_SAVE_PATH = "banana_model_v1.pth"
     NUM_EPOCHS = 5
     BATCH_SIZE = 16
     LEARNING_RATE = 0.001
+    loader_config = loader_config or LoaderConfig()
+
+    # Reproducible runs, and an explicit intra-op thread budget if requested
+    torch.manual_seed(loader_config.seed)
+    if loader_config.intra_op_threads > 0:
+        torch.set_num_threads(loader_config.intra_op_threads)
 
-    # Check if dataset exists
-    if not os.path.exists(os.path.join(DATA_DIR, "banana")) or not os.path.exists(os.path.join(DATA_DIR, "other")):
-        print(f"ERROR: Directories {DATA_DIR}/banana and {DATA_DIR}/other must exist and contain images!")
+    # Check if dataset exists (one sub-directory per class, e.g. banana/, apple/, other/)
+    class_dirs = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))] if os.path.isdir(DATA_DIR) else []
+    if len(class_dirs) < 2:
+        print(f"ERROR: {DATA_DIR}/ must contain at least two class directories (e.g. {DATA_DIR}/banana and {DATA_DIR}/other) with images!")
         return
 
     # 2. Data Transformations (Augmentation + Normalization)
-    data_transforms = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.RandomHorizontalFlip(),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    if cache_embeddings:
+        # Deterministic: the flip augmentation is baked into the cached views
+        data_transforms = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
+    else:
+        data_transforms = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.RandomHorizontalFlip(),
+            transforms.ToTensor(),
+            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
 
     # 3. Load Data
     try:
-        dataset = datasets.ImageFolder(DATA_DIR, transform=data_transforms)
+        if use_shards:
+            # Pre-resized uint8 images read through np.memmap (rebuilt only if dataset/ changed)
+            ensure_shards(DATA_DIR, SHARDS_DIR)
+            dataset = ShardDataset(SHARDS_DIR, augment=not cache_embeddings)
+        else:
+            dataset = datasets.ImageFolder(DATA_DIR, transform=data_transforms)
         print(f"Found {len(dataset)} images in {len(dataset.classes)} classes: {dataset.classes}")
     except Exception as e:
         print(f"Error loading data: {e}")
         return
 
-    dataloader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True)
+    # Delta pass: new/changed images plus replayed old ones, starting from the saved model
+    train_set = dataset
+    resume = False
+    if incremental:
+        if use_shards or cache_embeddings:
+            print("ERROR: --incremental trains on dataset/ directly, it can't be combined with --shards or --cache-embeddings")
+            return
+        split = incremental_indices(dataset, DATA_DIR, MODEL_SAVE_PATH, load_manifest(), loader_config.seed)
+        if split is not None:
+            new, replay = split
+            if not new:
+                print(f"No new or modified images since the last run, {MODEL_SAVE_PATH} is up to date")
+                return
+            print(f"Incremental pass: {len(new)} new/modified images + {len(replay)} replayed")
+            train_set = Subset(dataset, new + replay)
+            resume = True
 
     # 4. Load Pre-trained Model (MobileNetV2)
     print("Loading MobileNetV2...")
-    model = models.mobilenet_v2(weights=models.MobileNet_V2_Weights.DEFAULT)
+    model = models.mobilenet_v2(weights=None if resume else models.MobileNet_V2_Weights.DEFAULT)
 
     # Freeze weights (Transfer Learning)
     for param in model.parameters():
         param.requires_grad = False
 
-    # Replace last layer for binary classification (Banana vs Other)
+    # Replace last layer with one output per class (e.g. Banana vs Other)
     # MobileNetV2 classifier is a Sequential block, last item is Linear
-    model.classifier[1] = nn.Linear(model.last_channel, 2)
+    model.classifier[1] = nn.Linear(model.last_channel, len(dataset.classes))
+    if resume:
+        # Backbone saved unchanged (frozen, BatchNorm in eval mode), previously trained head
+        model.load_state_dict(torch.load(MODEL_SAVE_PATH, map_location="cpu"))
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Training on device: {device}")
@@ -58,43 +351,66 @@ def train_model():
     optimizer = optim.Adam(model.classifier.parameters(), lr=LEARNING_RATE)
 
     # 6. Training Loop
-    print("Starting training...")
-    loss_history = []
-    
-    for epoch in range(NUM_EPOCHS):
-        model.train()
-        running_loss = 0.0
-        correct = 0
-        total = 0
+    if cache_embeddings:
+        # The backbone is frozen, so its output only needs computing once
+        embeddings, labels = load_or_compute_embeddings(model, dataset, device, BATCH_SIZE, loader_config)
+        print("Starting training on cached embeddings...")
+        loss_history = train_head_on_embeddings(
+            model, embeddings, labels, criterion, optimizer, device, NUM_EPOCHS, BATCH_SIZE
+        )
+    else:
+        dataloader = make_dataloader(train_set, BATCH_SIZE, True, loader_config, device)
+        print(f"Starting training... ({loader_config.num_workers} loader workers, {torch.get_num_threads()} torch threads)")
+        loss_history = []
 
-        for inputs, labels in dataloader:
-            inputs, labels = inputs.to(device), labels.to(device)
+        for epoch in range(NUM_EPOCHS):
+            train_head_mode(model)
+            running_loss = 0.0
+            correct = 0
+            total = 0
+            data_time = compute_time = 0.0
 
-            optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
+            tick = time.perf_counter()
+            for inputs, labels in dataloader:
+                loaded = time.perf_counter()
+                data_time += loaded - tick
 
-            running_loss += loss.item()
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
+                inputs = inputs.to(device, non_blocking=True)
+                labels = labels.to(device, non_blocking=True)
 
-        epoch_loss = running_loss / len(dataloader)
-        epoch_acc = 100 * correct / total
-        loss_history.append(epoch_loss)
-        print(f"Epoch [{epoch+1}/{NUM_EPOCHS}] Loss: {epoch_loss:.4f} Acc: {epoch_acc:.2f}%")
+                optimizer.zero_grad()
+                outputs = model(inputs)
+                loss = criterion(outputs, labels)
+                loss.backward()
+                optimizer.step()
+
+                running_loss += loss.item()
+                _, predicted = torch.max(outputs.data, 1)
+                total += labels.size(0)
+                correct += (predicted == labels).sum().item()
+
+                tick = time.perf_counter()
+                compute_time += tick - loaded
+
+            epoch_loss = running_loss / len(dataloader)
+            epoch_acc = 100 * correct / total
+            loss_history.append(epoch_loss)
+            print(f"Epoch [{epoch+1}/{NUM_EPOCHS}] Loss: {epoch_loss:.4f} Acc: {epoch_acc:.2f}%")
+            print(f"    {_timing_report(data_time, compute_time)}")
 
     # 7. Save Model
     torch.save(model.state_dict(), MODEL_SAVE_PATH)
     print(f"Model saved to {MODEL_SAVE_PATH}")
     print("Class mapping:", dataset.class_to_idx)
-    
+
     # Save class mapping to a text file for inference
     with open("class_mapping.txt", "w") as f:
         f.write(str(dataset.class_to_idx))
-    
+
+    # Every image of dataset/ is now reflected in the saved model
+    if not use_shards:
+        save_manifest(dataset, DATA_DIR, MODEL_SAVE_PATH)
+
     # Plot training loss
     plt.plot(loss_history)
     plt.title("Training Loss")
@@ -104,4 +420,34 @@ def train_model():
     print("Loss plot saved to training_loss.png")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Fine-tune MobileNetV2 on dataset/")
+    parser.add_argument(
+        "--cache-embeddings", action="store_true",
+        help="compute frozen backbone features once and train the head on them"
+    )
+    parser.add_argument(
+        "--shards", action="store_true",
+        help=f"read training images from memory-mapped shards in {SHARDS_DIR}/"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help=f"fine-tune the saved model on images not yet in {TRAINING_MANIFEST_PATH}, plus a replay buffer"
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="DataLoader worker processes")
+    parser.add_argument("--prefetch", type=int, default=4, help="batches prefetched per worker")
+    parser.add_argument("--no-persistent-workers", action="store_true")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    train_model(
+        cache_embeddings=args.cache_embeddings,
+        use_shards=args.shards,
+        incremental=args.incremental,
+        loader_config=LoaderConfig(
+            num_workers=args.workers,
+            prefetch_factor=args.prefetch,
+            persistent_workers=not args.no_persistent_workers,
+            seed=args.seed,
+            intra_op_threads=args.threads,
+        ),
+    )
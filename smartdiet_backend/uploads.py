@@ -0,0 +1,144 @@
+import os
+import zipfile
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from buffers import BufferReader
+
+# Max size of a single uploaded image
+UPLOAD_MAX_BYTES = int(os.getenv("ML_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Room for multipart boundaries and part headers on top of the file limits
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Limits for /api/ai/recognize-food/batch
+BATCH_MAX_FILES = int(os.getenv("ML_BATCH_MAX_FILES", "16"))
+BATCH_MAX_PAYLOAD_BYTES = int(os.getenv("ML_BATCH_MAX_PAYLOAD_BYTES", str(20 * 1024 * 1024)))
+
+ARCHIVE_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".heic")
+
+
+def payload_too_large(max_bytes):
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Fichier trop volumineux (max {max_bytes} octets)",
+    )
+
+
+async def read_upload(upload, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Reads an UploadFile chunk by chunk and fails with 413 as soon as it grows
+    past `max_bytes`. Starlette has already spooled the part (to disk past
+    1 MB), so only the accepted bytes are ever held in memory: they are copied
+    into one bytearray preallocated from the part size (capped at
+    `max_bytes`) and returned as a memoryview over it. Read it through
+    buffers.BufferReader rather than io.BytesIO, which would copy it again.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise payload_too_large(max_bytes)
+
+    buffer = bytearray(min(upload.size if upload.size is not None else chunk_size, max_bytes))
+    total = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        end = total + len(chunk)
+        if end > max_bytes:
+            raise payload_too_large(max_bytes)
+        if end > len(buffer):
+            # Size unknown (or wrong): grow geometrically, never past max_bytes
+            buffer.extend(bytes(min(max(end, 2 * len(buffer)), max_bytes) - len(buffer)))
+        buffer[total:end] = chunk
+        total = end
+
+    # Release the spooled temporary file as soon as we have the bytes
+    await upload.close()
+    return memoryview(buffer)[:total]
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware bounding the request body of upload routes before the
+    multipart parser sees it: a too large Content-Length is answered with 413
+    right away, and chunked bodies are cut off once they exceed the limit.
+    """
+
+    def __init__(self, app, limits, default_limit=UPLOAD_MAX_BYTES, path_prefix="/api/ai/"):
+        self.app = app
+        self.limits = limits
+        self.default_limit = default_limit
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.limits.get(scope["path"], self.default_limit) + MULTIPART_OVERHEAD_BYTES
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": f"Requête trop volumineuse (max {max_bytes} octets)"},
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # HTTPException is re-raised as-is by FastAPI's body parsing
+                    raise payload_too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def is_archive(upload):
+    filename = (upload.filename or "").lower()
+    return upload.content_type in ARCHIVE_CONTENT_TYPES or filename.endswith(".zip")
+
+
+def extract_archive(data, max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_PAYLOAD_BYTES,
+                    max_file_bytes=UPLOAD_MAX_BYTES):
+    """
+    Returns [(filename, bytes)] for the images of a zip archive, in archive
+    order. Declared sizes are checked before anything is decompressed so a
+    zip bomb is rejected without inflating it; each image is held to the same
+    `max_file_bytes` limit as a single upload (zipfile never inflates an entry
+    past its declared size).
+    """
+    try:
+        archive = zipfile.ZipFile(BufferReader(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Archive zip invalide")
+
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        if len(entries) > max_files:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Maximum {max_files} images par requête",
+            )
+        if sum(info.file_size for info in entries) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Archive trop volumineuse (max {max_bytes} octets décompressés)",
+            )
+        for info in entries:
+            if info.file_size > max_file_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"{info.filename} : fichier trop volumineux (max {max_file_bytes} octets)",
+                )
+        return [(info.filename, archive.read(info)) for info in entries]